@@ -0,0 +1,262 @@
+"""
+Alignment of the sentences of an abridged book to the sentences of its source.
+
+Every sentence becomes the mean word vector of its words. The sentences of an
+abridged chapter are only compared with the original chapters whose chapter
+vectors are closest to it, plus their neighbours, a block of sentences at a
+time. The best matches then tell how much of each original chapter survived.
+
+Sentence matrices are kept in the vector store of a book's cache. Only building
+them needs spaCy, aligning matrices loaded from the store does not.
+"""
+import csv
+import logging
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+
+import numpy  # type: ignore
+
+from cache import digest
+from similarity import cosine_matrix, top_k, unit_rows
+from vectorstore import Vectors
+
+if TYPE_CHECKING:
+    from spacy import tokens  # type: ignore
+
+    from moby import Moby
+
+# bump when sentence vectors are computed differently so stored ones are redone
+VERSION = "1"
+
+log = logging.getLogger("align")
+
+
+def word_vectors(doc: "tokens.doc.Doc") -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Vector of every token of a doc straight from the vectors table, zero for
+    tokens without one, and the mask of tokens that are words.
+    """
+    from spacy import attrs  # type: ignore
+
+    array = doc.to_array([attrs.ORTH, attrs.IS_PUNCT, attrs.IS_SPACE])
+    array = array.reshape(len(doc), 3)
+    table = doc.vocab.vectors
+    rows = numpy.asarray(table.find(keys=array[:, 0]))
+    data = numpy.asarray(table.data, dtype="float32")
+    vectors = numpy.zeros((len(doc), data.shape[1]), dtype="float32")
+    found = rows >= 0
+    vectors[found] = data[rows[found]]
+    return vectors, (array[:, 1] == 0) & (array[:, 2] == 0)
+
+
+class SentenceMatrix:
+    """
+    The sentences of a book as rows: the mean vector of each sentence's words,
+    its chapter (a position in chapters), its number of words and its text.
+    """
+
+    def __init__(
+        self,
+        chapters: List[str],
+        chapter: numpy.ndarray,
+        vectors: numpy.ndarray,
+        words: numpy.ndarray,
+        texts: List[str],
+    ):
+        self.chapters = chapters
+        self.chapter = chapter
+        self.vectors = vectors
+        self.words = words
+        self.texts = texts
+        # row range of each chapter's sentences, with the total at the end
+        counts = numpy.bincount(chapter, minlength=len(chapters))
+        self.offsets = numpy.concatenate([[0], numpy.cumsum(counts)]).astype("int64")
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def chapter_vectors(self) -> numpy.ndarray:
+        """Mean word vector of every chapter, from the sentence means."""
+        sums = numpy.zeros((len(self.chapters), self.vectors.shape[1]), "float32")
+        numpy.add.at(sums, self.chapter, self.vectors * self.words[:, None])
+        words = numpy.bincount(self.chapter, self.words, minlength=len(self.chapters))
+        return sums / numpy.maximum(words, 1)[:, None]
+
+    def to_vectors(self) -> Vectors:
+        """
+        The sentence vectors keyed by chapter and sentence number within the
+        chapter, chapter_3:12, with the words and texts as metadata.
+        """
+        keys = []
+        for i, chapter in enumerate(self.chapters):
+            n = self.offsets[i + 1] - self.offsets[i]
+            keys += [f"{chapter}:{j}" for j in range(n)]
+        meta = {
+            "chapters": self.chapters,
+            "words": self.words.tolist(),
+            "texts": self.texts,
+        }
+        return Vectors(keys, self.vectors, meta)
+
+    @classmethod
+    def from_vectors(cls, vectors: Vectors) -> "SentenceMatrix":
+        chapters = vectors.meta["chapters"]
+        positions = {chapter: i for i, chapter in enumerate(chapters)}
+        chapter = [positions[key.rsplit(":", 1)[0]] for key in vectors.keys]
+        return cls(
+            chapters,
+            numpy.array(chapter, dtype="int64"),
+            vectors.matrix,
+            numpy.array(vectors.meta["words"], dtype="int64"),
+            vectors.meta["texts"],
+        )
+
+    @classmethod
+    def of_book(cls, book: "Moby") -> "SentenceMatrix":
+        """
+        The sentences of a book from its vector store, or computed from its
+        docs and stored. Docs are streamed, so only a batch is ever held.
+        """
+        store = book.vector_store
+        name = f"{book.title}.sentences"
+        source = digest(book.key(), "sentencevectors", VERSION)
+        if store is not None:
+            vectors = store.get(name, source)
+            if vectors is not None:
+                return cls.from_vectors(vectors)
+        matrix = cls.from_docs(book)
+        if store is not None:
+            store.put(name, matrix.to_vectors(), source)
+        return matrix
+
+    @classmethod
+    def from_docs(cls, book: "Moby") -> "SentenceMatrix":
+        chapter_ids: List[numpy.ndarray] = []
+        means: List[numpy.ndarray] = []
+        counts: List[numpy.ndarray] = []
+        texts: List[str] = []
+        chapters = list(book.ch_text)
+        for i, (_, doc) in enumerate(book.ch_doc.stream(chapters)):
+            if not len(doc):
+                continue
+            vectors, words = word_vectors(doc)
+            starts = numpy.array([s.start for s in doc.sents], dtype="int64")
+            sums = numpy.add.reduceat(vectors * words[:, None], starts)
+            n = numpy.add.reduceat(words.astype("int64"), starts)
+            means.append((sums / numpy.maximum(n, 1)[:, None]).astype("float32"))
+            counts.append(n)
+            chapter_ids.append(numpy.full(len(starts), i, dtype="int64"))
+            # whitespace collapsed, so a sentence is always one line of output
+            texts += [" ".join(s.text.split()) for s in doc.sents]
+        dim = means[0].shape[1] if means else 0
+        return cls(
+            chapters,
+            numpy.concatenate(chapter_ids or [numpy.zeros(0, "int64")]),
+            numpy.concatenate(means or [numpy.zeros((0, dim), "float32")]),
+            numpy.concatenate(counts or [numpy.zeros(0, "int64")]),
+            texts,
+        )
+
+
+def candidate_chapters(
+    a: SentenceMatrix, o: SentenceMatrix, chapters: int = 3, window: int = 1
+) -> List[numpy.ndarray]:
+    """
+    Original chapters each abridged chapter is compared with, the chapters
+    most similar by chapter vector together with window chapters either side.
+    """
+    similar, _ = top_k(
+        cosine_matrix(a.chapter_vectors(), o.chapter_vectors()), chapters
+    )
+    candidates = []
+    for row in similar:
+        near = (row[:, None] + numpy.arange(-window, window + 1)).reshape(-1)
+        candidates.append(numpy.unique(near[(near >= 0) & (near < len(o.chapters))]))
+    return candidates
+
+
+def align(
+    a: SentenceMatrix,
+    o: SentenceMatrix,
+    k: int = 3,
+    chapters: int = 3,
+    window: int = 1,
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    The k most similar original sentences of every abridged sentence, as rows
+    of original sentence numbers and rows of scores, best first. Rows have -1
+    and nan where there were fewer than k candidates.
+    """
+    a_unit, o_unit = unit_rows(a.vectors), unit_rows(o.vectors)
+    indices = numpy.full((len(a), k), -1, dtype="int64")
+    scores = numpy.full((len(a), k), numpy.nan, dtype="float32")
+    for i, candidates in enumerate(candidate_chapters(a, o, chapters, window)):
+        rows = slice(a.offsets[i], a.offsets[i + 1])
+        if rows.start == rows.stop:
+            continue
+        cols = numpy.concatenate(
+            [numpy.arange(o.offsets[c], o.offsets[c + 1]) for c in candidates]
+            or [numpy.zeros(0, "int64")]
+        )
+        if not len(cols):
+            continue
+        # one block of the abridged chapter's sentences against the candidates
+        block = a_unit[rows] @ o_unit[cols].T
+        best, best_scores = top_k(block, k)
+        indices[rows, : best.shape[1]] = cols[best]
+        scores[rows, : best.shape[1]] = best_scores
+    return indices, scores
+
+
+def coverage(
+    o: SentenceMatrix, best: numpy.ndarray, scores: numpy.ndarray, threshold: float
+) -> List[Dict[str, Any]]:
+    """
+    How much of each original chapter the abridged book kept. A sentence is
+    kept when it is the best match of some abridged sentence scoring at least
+    threshold, coverage is the share of the chapter's words in kept sentences.
+    """
+    kept = numpy.zeros(len(o), dtype="bool")
+    kept[best[(best >= 0) & (scores >= threshold)]] = True
+    n = len(o.chapters)
+    sentences = numpy.bincount(o.chapter, minlength=n)
+    kept_sentences = numpy.bincount(o.chapter[kept], minlength=n)
+    words = numpy.bincount(o.chapter, o.words, minlength=n)
+    kept_words = numpy.bincount(o.chapter[kept], o.words[kept], minlength=n)
+    return [
+        {
+            "chapter": chapter,
+            "sentences": int(sentences[i]),
+            "kept sentences": int(kept_sentences[i]),
+            "coverage": float(kept_words[i] / words[i]) if words[i] else 0.0,
+        }
+        for i, chapter in enumerate(o.chapters)
+    ]
+
+
+def write_alignment(
+    path: str,
+    a: SentenceMatrix,
+    o: SentenceMatrix,
+    indices: numpy.ndarray,
+    scores: numpy.ndarray,
+) -> None:
+    """Writes a row per abridged sentence and match as tsv, best match first."""
+    with open(path, "w") as fh:
+        writer = csv.writer(fh, delimiter="\t")
+        writer.writerow(
+            ["chapter", "sentence", "rank", "match chapter", "score", "match"]
+        )
+        for i in range(len(a)):
+            for rank, (j, score) in enumerate(zip(indices[i], scores[i])):
+                if j < 0:
+                    break
+                writer.writerow(
+                    [
+                        a.chapters[a.chapter[i]],
+                        a.texts[i],
+                        rank + 1,
+                        o.chapters[o.chapter[j]],
+                        f"{score:0.4f}",
+                        o.texts[j],
+                    ]
+                )
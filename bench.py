@@ -0,0 +1,218 @@
+"""
+Benchmarks of the Moby analysis pipeline.
+
+Times every stage of building and analyzing a book, from splitting the text
+into chapters through parsing, loading from the cache and each of the metrics,
+for the real books and for synthetic books made by repeating the original.
+Results are json records of wall time, tokens per second and peak resident
+memory, and can be saved as a baseline that later runs are compared against.
+
+    python bench.py run --scales=[2,4] --out=/script/output/bench.json
+"""
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import fire  # type: ignore
+
+from instrument import peak_rss_mb
+
+log = logging.getLogger("bench")
+
+BOOKS: Dict[str, str] = {
+    "original": "/script/data/original_moby_dick.txt",
+    "abridged": "/script/data/abridged_moby_dick.txt",
+    "frankenstein": "/script/data/frankenstein.txt",
+}
+BASELINE_PATH = "/script/bench_baseline.json"
+# what the main.py commands ask for between them, minus the parse and entities
+ANNOTATIONS = {"sents", "lemmas"}
+SEARCH = {"ahab", "stubb", "queequeg", "starbuck", "pequod", "moby", "jonah", "pip"}
+# a stage regresses when it takes this much longer than in the baseline
+TOLERANCE = 1.2
+
+
+def scaled_book(path: str, scale: int, out_dir: str) -> str:
+    """
+    Writes the book repeated scale times with chapters renumbered. Every copy
+    of a chapter gets a line of its own so the doc cache cannot share parses
+    between copies.
+    """
+    from moby import read_chapters
+
+    chapters = list(read_chapters(path))
+    out = os.path.join(out_dir, f"x{scale}_{os.path.basename(path)}")
+    with open(out, "w") as fh:
+        n = 0
+        for copy in range(scale):
+            for _, text in chapters:
+                n += 1
+                fh.write(f"CHAPTER {n}\n(copy {copy + 1})\n{text}")
+    return out
+
+
+def _stage(
+    results: List[Dict[str, Any]],
+    case: str,
+    stage: str,
+    run: Callable[[], Any],
+    tokens: Optional[int] = None,
+) -> Any:
+    start = time.perf_counter()
+    value = run()
+    seconds = time.perf_counter() - start
+    record = {
+        "case": case,
+        "stage": stage,
+        "seconds": seconds,
+        "tokens": tokens,
+        "tokens_per_sec": tokens / seconds if tokens and seconds else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    log.info(f"{case} {stage}: {seconds:0.4f}s")
+    results.append(record)
+    return value
+
+
+def bench_book(args: Tuple[str, str, str, int]) -> List[Dict[str, Any]]:
+    """
+    Every stage for one book, run in a fresh worker process so the peak memory
+    is the book's own. The doc cache starts out empty, so parse is a cold
+    build and load is the warm build of a second instance.
+    """
+    case, path, cache_dir, n_process = args
+    from moby import ChapterText, Moby, load_nlp, load_syllables
+    from similarity import cosine_matrix
+
+    results: List[Dict[str, Any]] = []
+    _stage(results, case, "load model", load_nlp)
+    _stage(results, case, "load syllables", lambda: load_syllables(cache_dir))
+    _stage(results, case, "split", lambda: ChapterText(path))
+    cold = Moby(case, path, None, cache_dir, n_process, annotations=ANNOTATIONS)
+    table = _stage(results, case, "parse", lambda: cold.token_table)
+    tokens = len(table)
+    results[-1]["tokens"] = tokens
+    results[-1]["tokens_per_sec"] = tokens / results[-1]["seconds"]
+    book = Moby(case, path, None, cache_dir, n_process, annotations=ANNOTATIONS)
+    _stage(results, case, "load", lambda: book.token_table, tokens)
+    _stage(results, case, "totals", lambda: book.totals, tokens)
+    for count in [
+        "count_tokens",
+        "count_letters",
+        "count_words",
+        "count_sentences",
+        "count_syllables",
+    ]:
+        # book's totals are memoized, a fresh instance counts from its tables
+        fresh = Moby(case, path, None, cache_dir, n_process, annotations=ANNOTATIONS)
+        _stage(results, case, count, getattr(fresh, count), tokens)
+    _stage(results, case, "statistics", book.statistics, tokens)
+    _stage(results, case, "indexes", book.indexes, tokens)
+    _stage(results, case, "freq index", lambda: book.freq_index, tokens)
+    _stage(results, case, "freq", lambda: book.freq(SEARCH, "NNP"), tokens)
+    _stage(results, case, "propn", book.propn, tokens)
+    _stage(results, case, "verb", book.verb, tokens)
+    _stage(results, case, "load docs", book.ch_doc.materialize, tokens)
+    _stage(results, case, "sent_data", book.sent_data, tokens)
+    vectors = _stage(results, case, "chapter vectors", book.chapter_vectors, tokens)
+    _stage(results, case, "sim", lambda: cosine_matrix(vectors, vectors), tokens)
+    return results
+
+
+def bench_commands(cache_dir: str, out_dir: str) -> List[Dict[str, Any]]:
+    """
+    The sim and topic commands end to end, after the books were cached, with
+    their output written to out_dir.
+    """
+    import main
+
+    main.CACHE_DIR = cache_dir
+    main.OUTPUT_DIR = out_dir
+    os.makedirs(out_dir, exist_ok=True)
+    results: List[Dict[str, Any]] = []
+    commands: List[Callable[[], Any]] = [main.sim, main.topic]
+    for command in commands:
+        _stage(results, "commands", command.__name__, command)
+    return results
+
+
+def compare(
+    results: List[Dict[str, Any]],
+    baseline: List[Dict[str, Any]],
+    tolerance: float = TOLERANCE,
+) -> List[Dict[str, Any]]:
+    """Stages that took more than tolerance times their baseline time."""
+    before = {(r["case"], r["stage"]): r["seconds"] for r in baseline}
+    regressions = []
+    for r in results:
+        seconds = before.get((r["case"], r["stage"]))
+        # sub millisecond stages are all noise
+        if seconds and r["seconds"] > 1e-3 and r["seconds"] > tolerance * seconds:
+            regressions.append({**r, "baseline_seconds": seconds})
+    return regressions
+
+
+def run(
+    books: Optional[List[str]] = None,
+    scales: Optional[List[int]] = None,
+    commands: bool = False,
+    n_process: int = 1,
+    out: Optional[str] = None,
+    baseline: str = BASELINE_PATH,
+    save_baseline: bool = False,
+    tolerance: float = TOLERANCE,
+) -> None:
+    """
+    Benchmarks the books, all of them by default, plus the original scaled up
+    by each of scales, writing the records as json to out or stdout. Exits
+    with status 1 when any stage regressed against the baseline.
+    """
+    results: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = [(title, BOOKS[title]) for title in (books or list(BOOKS))]
+        for scale in scales or []:
+            path = scaled_book(BOOKS["original"], scale, tmp)
+            cases.append((f"original x{scale}", path))
+        cache_dir = os.path.join(tmp, "cache")
+        for case, path in cases:
+            # one process per case, so each case's peak memory is its own
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                job = (case, path, cache_dir, n_process)
+                results += pool.submit(bench_book, job).result()
+        if commands:
+            results += bench_commands(cache_dir, os.path.join(tmp, "output"))
+    report = json.dumps(results, indent=2)
+    if out:
+        with open(out, "w") as fh:
+            fh.write(report)
+    else:
+        print(report)
+    if save_baseline:
+        with open(baseline, "w") as fh:
+            fh.write(report)
+        log.info(f"saved baseline {baseline}")
+    elif os.path.exists(baseline):
+        with open(baseline) as fh:
+            regressions = compare(results, json.load(fh), tolerance)
+        for r in regressions:
+            log.warning(
+                f"{r['case']} {r['stage']}: {r['seconds']:0.4f}s "
+                f"was {r['baseline_seconds']:0.4f}s"
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        stream=sys.stderr,
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(message)s",
+        datefmt="%Y-%m-%dT%I:%M:%S",
+    )
+    fire.Fire({"run": run})
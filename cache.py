@@ -0,0 +1,110 @@
+"""
+Content addressed on-disk cache shared by the text analysis tools.
+
+Entries are opaque blobs named by a digest of whatever produced them, so a
+changed input simply misses the cache instead of needing explicit invalidation.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Any, Optional
+
+log = logging.getLogger("cache")
+
+
+def digest(*parts: str) -> str:
+    """Stable hex digest over an ordered sequence of strings."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        # separator so ("ab", "c") and ("a", "bc") do not collide
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class Cache:
+    """
+    Directory of blobs keyed by digest and file extension. Blobs are sharded
+    into sub directories by the first two characters of the key.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, key: str, ext: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.{ext}")
+
+    def get(self, key: str, ext: str) -> Optional[bytes]:
+        """Returns the cached blob or None on a miss."""
+        try:
+            with open(self.path(key, ext), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, ext: str, data: bytes) -> None:
+        """Atomically writes a blob, concurrent writers of the same key are safe."""
+        path = self.path(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+class MetricsCache:
+    """
+    Memo of small json serializable values, such as the counts and indexes of a
+    book. It holds at most maxsize values, dropping the least recently used,
+    and belongs to a single object so it goes away with it. Once bound to a
+    Cache and key the values are also read from and written to disk.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._values: "OrderedDict[str, Any]" = OrderedDict()
+        self._cache: Optional[Cache] = None
+        self._key: Optional[str] = None
+
+    @property
+    def bound(self) -> bool:
+        return self._key is not None
+
+    def bind(self, cache: Cache, key: str) -> None:
+        """Loads the values stored under key and stores new values there."""
+        self._cache, self._key = cache, key
+        data = cache.get(key, "json")
+        if data is not None:
+            for name, value in json.loads(data.decode("utf-8")).items():
+                self._remember(name, value)
+
+    def clear(self) -> None:
+        """Forgets every value and the binding, for when the source changes."""
+        self._values.clear()
+        self._cache = self._key = None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._values
+
+    def __getitem__(self, name: str) -> Any:
+        self._values.move_to_end(name)
+        return self._values[name]
+
+    def __setitem__(self, name: str, value: Any) -> None:
+        self._remember(name, value)
+        if self._cache is not None and self._key is not None:
+            data = json.dumps(dict(self._values)).encode("utf-8")
+            self._cache.put(self._key, "json", data)
+
+    def _remember(self, name: str, value: Any) -> None:
+        self._values[name] = value
+        self._values.move_to_end(name)
+        while len(self._values) > self.maxsize:
+            self._values.popitem(last=False)
@@ -0,0 +1,107 @@
+"""
+Histogram charts of pre-binned word counts and line charts of readability.
+
+Each chart is rendered from the rows of histogram.bin_rows or of
+readability.profile and saved as html. Histograms read their rows from a
+compact json file next to the html, so the page stays small however many
+words are charted. Many charts are rendered side by side
+in worker processes, since building and saving a chart is pure Python and the
+charts do not depend on each other.
+"""
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import altair as alt  # type: ignore
+
+from workers import run_pool
+
+log = logging.getLogger("charts")
+
+
+def data_file(rows: List[Dict[str, Any]], path: str) -> alt.UrlData:
+    """
+    Writes rows as json next to the chart at path, with the same name and a
+    .json extension, and points the chart at it.
+    """
+    data_path = os.path.splitext(path)[0] + ".json"
+    with open(data_path, "w") as fh:
+        json.dump(rows, fh, separators=(",", ":"))
+    return alt.UrlData(os.path.basename(data_path))
+
+
+def index_hist(rows: List[Dict[str, Any]], label: str, path: str) -> None:
+    """Counts over the normalized index, a row of bars per title."""
+    alt.Chart(data_file(rows, path)).mark_bar().encode(
+        x=alt.X(
+            title="normalized index",
+            bin="binned",
+            field="bin_start",
+            type="quantitative",
+            scale=alt.Scale(domain=[0, 1]),
+        ),
+        x2=alt.X2(field="bin_end"),
+        y=alt.Y(title=f"{label} count", field="count", type="quantitative"),
+        row=alt.Row(field="title", type="nominal"),
+    ).save(path)
+
+
+def chapter_hist(rows: List[Dict[str, Any]], label: str, path: str) -> None:
+    """Counts per chapter, a row of bars per word."""
+    alt.Chart(data_file(rows, path), width=1000).mark_bar().encode(
+        x=alt.X(title="Chapter", bin="binned", field="bin_start", type="quantitative"),
+        x2=alt.X2(field="bin_end"),
+        y=alt.Y(title=f"word count", field="count", type="quantitative"),
+        row=alt.Row(field="word", type="nominal"),
+    ).save(path)
+
+
+def index_line(rows: List[Dict[str, Any]], label: str, path: str) -> None:
+    """A readability score over the normalized index, a line per title."""
+    alt.Chart(alt.Data(values=rows), width=1000).mark_line().encode(
+        x=alt.X(
+            title="normalized index",
+            field="norm_index",
+            type="quantitative",
+            scale=alt.Scale(domain=[0, 1]),
+        ),
+        y=alt.Y(title=label.replace("_", " "), field=label, type="quantitative"),
+        color=alt.Color(field="title", type="nominal"),
+    ).save(path)
+
+
+def chapter_line(rows: List[Dict[str, Any]], label: str, path: str) -> None:
+    """A readability score per chapter, a line per title."""
+    alt.Chart(alt.Data(values=rows), width=1000).mark_line(point=True).encode(
+        x=alt.X(title="Chapter", field="chapter", type="quantitative"),
+        y=alt.Y(title=label.replace("_", " "), field=label, type="quantitative"),
+        color=alt.Color(field="title", type="nominal"),
+    ).save(path)
+
+
+CHARTS = {
+    "index": index_hist,
+    "chapter": chapter_hist,
+    "index line": index_line,
+    "chapter line": chapter_line,
+}
+
+
+def _render(job: Tuple[str, List[Dict[str, Any]], str, str]) -> str:
+    kind, rows, label, path = job
+    CHARTS[kind](rows, label, path)
+    return path
+
+
+def render(
+    jobs: List[Tuple[str, List[Dict[str, Any]], str, str]],
+    processes: Optional[int] = None,
+) -> List[str]:
+    """
+    Renders (kind, rows, label, path) charts, kind is a key of CHARTS, with up
+    to processes at once, see workers.pool_size. Returns the paths.
+    """
+    paths = run_pool(_render, jobs, processes)
+    log.info(f"rendered {len(paths)} charts")
+    return paths
@@ -0,0 +1,131 @@
+"""
+Many books analyzed together.
+
+A corpus is built from a manifest of titles and text paths. Books are parsed
+side by side, one book per worker process, and the workers share the doc cache
+so a book parsed once is only ever loaded afterwards.
+"""
+import csv
+import logging
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from instrument import active
+from moby import Moby
+from tokentable import TokenTable
+from workers import run_pool
+
+log = logging.getLogger("corpus")
+
+
+def read_manifest(path: str) -> Dict[str, str]:
+    """Reads a tsv of title and text path per line, # starts a comment."""
+    manifest: Dict[str, str] = {}
+    with open(path, "r") as fh:
+        for row in csv.reader(fh, delimiter="\t"):
+            if row and not row[0].startswith("#"):
+                title, text_path = row[0].strip(), row[1].strip()
+                manifest[title] = text_path
+    return manifest
+
+
+def _build_table(
+    args: Tuple[str, str, Optional[int], Optional[str], Optional[Set[str]], int]
+) -> TokenTable:
+    """Worker side of Corpus.build, parses a single book."""
+    title, text_path, limiter, cache_dir, annotations, n_process = args
+    book = Moby(
+        title, text_path, limiter, cache_dir, n_process, annotations=annotations
+    )
+    return book.token_table
+
+
+class Corpus:
+    """
+    The books of a manifest, title to text path, with the cross book versions
+    of the Moby analyses. Books are built lazily by build(), with up to
+    processes books in parallel, see workers.pool_size, and each book is
+    parsed by n_process spaCy processes.
+    """
+
+    def __init__(
+        self,
+        manifest: Dict[str, str],
+        limiter: Optional[int] = None,
+        cache_dir: Optional[str] = None,
+        annotations: Optional[Set[str]] = None,
+        processes: Optional[int] = None,
+        n_process: int = 1,
+    ):
+        self.manifest = manifest
+        self.limiter = limiter
+        self.cache_dir = cache_dir
+        self.annotations = annotations
+        self.processes = processes
+        self.n_process = n_process
+        self._books: Optional[Dict[str, Moby]] = None
+
+    @property
+    def books(self) -> Dict[str, Moby]:
+        if self._books is None:
+            self._books = self.build()
+        return self._books
+
+    def build(self) -> Dict[str, Moby]:
+        """
+        Parses every book in a pool of worker processes and hands the token
+        tables back, so corpus wide counts never need the docs in this process.
+        While tracing the books are parsed here, so their spans are recorded.
+        """
+        jobs = [
+            (
+                title,
+                path,
+                self.limiter,
+                self.cache_dir,
+                self.annotations,
+                self.n_process,
+            )
+            for title, path in self.manifest.items()
+        ]
+        log.info(f"building {len(jobs)} books")
+        # spans recorded in a worker process never reach the trace
+        processes = 1 if active() else self.processes
+        tables = run_pool(_build_table, jobs, processes)
+        books: Dict[str, Moby] = {}
+        for (title, path, *_), table in zip(jobs, tables):
+            books[title] = Moby(
+                title, path, self.limiter, self.cache_dir, annotations=self.annotations
+            )
+            books[title].token_table = table
+        return books
+
+    def _combined(self, count: Callable[[Moby], Counter]) -> Dict[str, Dict[str, int]]:
+        combined: Dict[str, Dict[str, int]] = {}
+        for title, book in self.books.items():
+            for word, n in count(book).items():
+                if word not in combined:
+                    combined[word] = {t: 0 for t in self.books}
+                combined[word][title] += n
+        return combined
+
+    def propn(self) -> Dict[str, Dict[str, int]]:
+        """Proper noun counts of every book, keyed by lemma then title."""
+        return self._combined(lambda book: book.propn())
+
+    def verb(self) -> Dict[str, Dict[str, int]]:
+        """Verb counts of every book, keyed by lemma then title."""
+        return self._combined(lambda book: book.verb())
+
+    def statistics(self) -> Dict[str, Dict[str, Any]]:
+        return {title: book.statistics() for title, book in self.books.items()}
+
+    def indexes(self) -> Dict[str, Dict[str, Any]]:
+        return {title: book.indexes() for title, book in self.books.items()}
+
+
+def top_by(
+    combined: Dict[str, Dict[str, int]], title: str
+) -> List[Tuple[str, Dict[str, int]]]:
+    """Combined counts sorted by the counts of one book, highest first."""
+    return sorted(combined.items(), key=lambda kv: kv[1][title], reverse=True)
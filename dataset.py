@@ -0,0 +1,116 @@
+"""
+Sentence classification datasets for pytext.
+
+Every sentence of a book becomes a row of its chapter key and the lemmas of its
+content words, written to train, test or eval tsv files as the chapters are
+read. Rows are assigned to a split by a hash of the row, so the same text always
+gives the same files, and lemmas come from the cached token tables so nothing
+is parsed twice.
+"""
+import csv
+import hashlib
+import logging
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from moby import Moby
+from tokentable import TokenTable
+from workers import run_pool
+
+log = logging.getLogger("dataset")
+
+# Split names and the share of rows each gets, in bucket order.
+SPLITS: List[Tuple[str, float]] = [("eval", 0.1), ("test", 0.2), ("train", 0.7)]
+
+
+def split_of(chapter: str, text: str) -> str:
+    """
+    The split a row belongs in. The row hashes to a point in [0, 1) which falls
+    into one of the SPLITS buckets, so a row lands in the same split on every
+    run and regardless of what other rows there are.
+    """
+    h = hashlib.sha1(f"{chapter}\0{text}".encode("utf-8")).digest()
+    point = int.from_bytes(h[:8], "big") / 2**64
+    edge = 0.0
+    for name, share in SPLITS:
+        edge += share
+        if point < edge:
+            return name
+    return SPLITS[-1][0]
+
+
+def sentence_lemmas(table: TokenTable) -> Iterator[str]:
+    """
+    The lemmas of every sentence of a table joined by spaces, leaving out stop
+    words, punctuation and whitespace. Sentences without any such words give
+    an empty string.
+    """
+    keep = table.words & ~table.is_stop
+    for lemmas in table.sentence_strings("lemma", keep):
+        yield " ".join(lemmas)
+
+
+def shard_paths(out_dir: str, shard: int = 0, shards: int = 1) -> Dict[str, str]:
+    """Output file of each split, numbered when the output is sharded."""
+    suffix = "" if shards == 1 else f"-{shard:05d}-of-{shards:05d}"
+    return {name: os.path.join(out_dir, f"{name}{suffix}.tsv") for name, _ in SPLITS}
+
+
+def export_shard(
+    args: Tuple[str, str, str, Optional[int], Optional[str], int, int, int]
+) -> Dict[str, int]:
+    """
+    Writes the rows of every shards-th chapter, starting at chapter number
+    shard, to that shard's files and returns the rows per split. Chapters are
+    read one batch at a time so memory does not grow with the book.
+    """
+    title, text_path, out_dir, limiter, cache_dir, shard, shards, n_process = args
+    book = Moby(
+        title,
+        text_path,
+        limiter,
+        cache_dir,
+        n_process,
+        annotations={"sents", "lemmas"},
+    )
+    chapters = [ch for i, ch in enumerate(book.ch_text) if i % shards == shard]
+    paths = shard_paths(out_dir, shard, shards)
+    handles = {name: open(path, "w") for name, path in paths.items()}
+    counts = {name: 0 for name in paths}
+    try:
+        writers = {name: csv.writer(fh, delimiter="\t") for name, fh in handles.items()}
+        for chapter, table in book.chapter_tables(chapters):
+            for text in sentence_lemmas(table):
+                name = split_of(chapter, text)
+                writers[name].writerow([chapter, text])
+                counts[name] += 1
+    finally:
+        for fh in handles.values():
+            fh.close()
+    return counts
+
+
+def export(
+    title: str,
+    text_path: str,
+    out_dir: str,
+    limiter: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+    shards: int = 1,
+    processes: Optional[int] = 1,
+    n_process: int = 1,
+) -> Dict[str, int]:
+    """
+    Writes the dataset of a book as shards sets of split files, with up to
+    processes shards exported at once, see workers.pool_size, each parsing
+    with n_process spaCy processes, and returns the rows per split.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = [
+        (title, text_path, out_dir, limiter, cache_dir, shard, shards, n_process)
+        for shard in range(shards)
+    ]
+    results = run_pool(export_shard, jobs, processes)
+    counts = {name: sum(r[name] for r in results) for name, _ in SPLITS}
+    log.info(f"exported {title} to {out_dir}: {counts}")
+    return counts
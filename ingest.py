@@ -0,0 +1,156 @@
+"""
+Raw book files to clean, chapter segmented text.
+
+Raw Gutenberg or OCR files carry license headers and footers, front matter and
+contents lists, hard wrapped lines and words hyphenated across lines. One pass
+over the lines of a raw file joins wrapped lines into paragraphs, repairs the
+hyphenation, finds the chapter headings and drops everything outside the
+chapters. The output has a "CHAPTER n" line before every chapter and a line per
+paragraph, which is what Moby splits books by.
+"""
+import logging
+import os
+import re
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from workers import run_pool
+
+log = logging.getLogger("ingest")
+
+# A heading is "Chapter" and an arabic or roman number alone on a line, or with
+# a title after it, which a wrapped line of prose (lowercase) never looks like.
+HEADING = re.compile(
+    r"^\s*(?i:chapter)\s+(\d{1,3}|(?i:[ivxlc]+))\b[.:]?\s*(?P<title>[^a-z\s].*)?$"
+)
+# Lines where the book has ended and license text or publisher lists begin.
+END_MARKERS = [
+    re.compile(r"^\W*end of (the|this) project gutenberg", re.IGNORECASE),
+    re.compile(r"^\W*\*\*\*\s*end of", re.IGNORECASE),
+    re.compile(r"^(collect the )?complete (list|series) of", re.IGNORECASE),
+]
+ROMAN = {"i": 1, "v": 5, "x": 10, "l": 50, "c": 100}
+
+# A paragraph is a list of lines, a heading is the chapter number and title.
+Heading = Tuple[int, str]
+
+
+def roman_to_int(numeral: str) -> int:
+    total = 0
+    values = [ROMAN[c] for c in numeral.lower()]
+    for value, following in zip(values, values[1:] + [0]):
+        total += -value if value < following else value
+    return total
+
+
+def heading_number(line: str) -> Optional[Heading]:
+    """Chapter number and title of a heading line, None for other lines."""
+    m = HEADING.match(line)
+    if m is None:
+        return None
+    number = m.group(1)
+    n = int(number) if number.isdigit() else roman_to_int(number)
+    return n, (m.group("title") or "").strip()
+
+
+def join_lines(lines: List[str]) -> str:
+    """
+    The lines of a paragraph as one line. A word broken with a hyphen at the
+    end of a line is put back together when it continues in lowercase, while
+    dashes (--) and hyphenated names such as Carnegie-Mellon keep theirs.
+    """
+    text = ""
+    for line in lines:
+        line = line.strip()
+        if not text:
+            text = line
+        elif text.endswith("-") and not text.endswith("--") and text[-2:-1].isalpha():
+            # a broken word loses its hyphen, a hyphenated name keeps it
+            text = (text[:-1] if line[:1].islower() else text) + line
+        else:
+            text = f"{text} {line}"
+    return text
+
+
+def read_lines(path: str) -> Iterator[str]:
+    """Lines without line endings, any of \\n, \\r\\n or a lone \\r."""
+    with open(path, "r", encoding="utf-8-sig", newline=None) as fh:
+        for line in fh:
+            yield line.rstrip()
+
+
+def chapters(lines: Iterable[str]) -> Iterator[Tuple[int, List[str]]]:
+    """
+    Yields the number and paragraphs of every chapter. Headings have to count
+    up from 1, so chapter references in the text and lists of contents are not
+    taken for headings. Text before the first heading and from an END_MARKERS
+    line after it on is dropped, as are chapters without any text, which is what the
+    entries of a contents list look like.
+    """
+    number = 0
+    emitted = False
+    title: List[str] = []
+    paragraphs: List[str] = []
+    block: List[str] = []
+    for line in lines:
+        if number and any(marker.match(line) for marker in END_MARKERS):
+            break
+        heading = heading_number(line) if not block else None
+        if heading is not None and (
+            heading[0] == number + 1 or (heading[0] == 1 and not emitted)
+        ):
+            if paragraphs:
+                yield number, title + paragraphs
+                emitted = True
+            number, paragraphs = heading[0], []
+            title = [heading[1]] if heading[1] else []
+        elif not line.strip():
+            if block and number:
+                paragraphs.append(join_lines(block))
+            block = []
+        else:
+            block.append(line)
+    if block and number:
+        paragraphs.append(join_lines(block))
+    if paragraphs:
+        yield number, title + paragraphs
+
+
+def write_book(path: str, book: Iterable[Tuple[int, List[str]]]) -> int:
+    """Writes chapters in the layout Moby reads, returns the number written."""
+    n = 0
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        for number, paragraphs in book:
+            fh.write(f"CHAPTER {number}\n\n")
+            for paragraph in paragraphs:
+                fh.write(f"{paragraph}\n\n")
+            n += 1
+    os.replace(tmp, path)
+    return n
+
+
+def ingest_file(args: Tuple[str, str]) -> Tuple[str, int]:
+    """Cleans a raw file into out_path, returns the path and chapter count."""
+    raw_path, out_path = args
+    n = write_book(out_path, chapters(read_lines(raw_path)))
+    log.info(f"wrote {n} chapters of {raw_path} to {out_path}")
+    return out_path, n
+
+
+def ingest(
+    paths: List[str], out_dir: str, processes: Optional[int] = None
+) -> List[Tuple[str, int]]:
+    """
+    Cleans raw files into out_dir, each named after its raw file with a .txt
+    extension, with up to processes files at once, see workers.pool_size.
+    Returns the clean paths and their chapter counts.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = [
+        (
+            path,
+            os.path.join(out_dir, os.path.splitext(os.path.basename(path))[0] + ".txt"),
+        )
+        for path in paths
+    ]
+    return run_pool(ingest_file, jobs, processes)
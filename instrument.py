@@ -0,0 +1,138 @@
+"""
+Timing and memory instrumentation of the analysis stages.
+
+Stages are marked with span(), which does nothing unless a Trace is active, so
+the marks stay in place for normal runs. While tracing, every span records its
+wall time, nesting depth and the resident memory of the process when it ends,
+plus Python heap usage from tracemalloc when memory tracing is on.
+"""
+import json
+import logging
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+log = logging.getLogger("instrument")
+
+
+def peak_rss_mb() -> float:
+    """High water mark of resident memory of this process."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on linux and bytes on macos
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def rss_mb() -> float:
+    """Resident memory of this process right now, the peak where unavailable."""
+    try:
+        with open("/proc/self/statm") as fh:
+            pages = int(fh.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+class Trace:
+    """
+    Events recorded by spans, in the order they finished. Each event is a dict
+    of name, start (seconds since the trace began), seconds, depth and memory,
+    plus whatever fields the span was given.
+    """
+
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.events: List[Dict[str, Any]] = []
+        self.depth = 0
+        self.began = time.perf_counter()
+
+    def record(self, name: str, start: float, seconds: float, **fields: Any) -> None:
+        event = {
+            "name": name,
+            "start": start - self.began,
+            "seconds": seconds,
+            "depth": self.depth,
+            "rss_mb": rss_mb(),
+        }
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            event["heap_mb"] = current / (1024 * 1024)
+            event["heap_peak_mb"] = peak / (1024 * 1024)
+        event.update(fields)
+        self.events.append(event)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Count and total seconds of the spans of each name."""
+        totals: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"count": 0, "seconds": 0.0}
+        )
+        for event in self.events:
+            totals[event["name"]]["count"] += 1
+            totals[event["name"]]["seconds"] += event["seconds"]
+        return dict(totals)
+
+    def write(self, path: str) -> None:
+        with open(path, "w") as fh:
+            json.dump({"events": self.events, "summary": self.summary()}, fh)
+
+
+_trace: Optional[Trace] = None
+
+
+def active() -> Optional[Trace]:
+    """The trace being recorded, None when not tracing."""
+    return _trace
+
+
+@contextmanager
+def tracing(memory: bool = False) -> Iterator[Trace]:
+    """Records spans into a new trace for the duration of the block."""
+    global _trace
+    previous, _trace = _trace, Trace(memory)
+    started_malloc = memory and not tracemalloc.is_tracing()
+    if started_malloc:
+        tracemalloc.start()
+    try:
+        yield _trace
+    finally:
+        if started_malloc:
+            tracemalloc.stop()
+        _trace = previous
+
+
+@contextmanager
+def span(name: str, **fields: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Times the block as one stage. Yields the fields so the block can add what
+    it learns along the way, such as the number of tokens it handled.
+    """
+    trace = _trace
+    if trace is None:
+        yield fields
+        return
+    start = time.perf_counter()
+    trace.depth += 1
+    try:
+        yield fields
+    finally:
+        trace.depth -= 1
+        trace.record(name, start, time.perf_counter() - start, **fields)
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """Decorator form of span for stages that are whole functions."""
+
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -10,17 +10,20 @@ Comparison between original and an abridged version of the Moby Dick novel.
 import csv
 import json
 import logging
-import random
 import sys
+import time
 from collections import defaultdict
-from typing import Dict, List, Optional, Set
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set
 
-import altair as alt  # type: ignore
 import fire  # type: ignore
-import gensim as gen  # type: ignore
-import pandas as pd  # type: ignore
 
-from moby import Moby
+from instrument import span, tracing
+
+# spacy (through moby), altair, gensim and pandas take seconds to import, so
+# they are imported by the commands that use them rather than here.
+if TYPE_CHECKING:
+    from corpus import Corpus
+    from moby import Moby
 
 OUTPUT_DIR: str = "/script/output"
 # constant variables for book names
@@ -32,99 +35,125 @@ FRANKENSTEIN = "frankenstein"
 ORIGINAL_TEXT_PATH = "/script/data/original_moby_dick.txt"
 ABRIDGED_TEXT_PATH = "/script/data/abridged_moby_dick.txt"
 FRANKENSTEIN_TEXT_PATH = "/script/data/frankenstein.txt"
+# raw sources, cleaned by the ingest command
+RAW_PATHS = "/script/data/raw/*.raw"
+CLEAN_DIR = "/script/data/clean"
 # limit the number of chapters to anaylize, None is all chapters
 LIMITER: Optional[int] = None
+# parsed chapter docs are cached here between runs, None disables the cache
+CACHE_DIR: Optional[str] = "/script/cache"
+# spaCy worker processes used to parse chapters, -1 uses every cpu
+N_PROCESS: int = 1
 
 log = logging.getLogger("main")
 
+BOOKS: Dict[str, str] = {
+    ORIGINAL: ORIGINAL_TEXT_PATH,
+    ABRIDGED: ABRIDGED_TEXT_PATH,
+    FRANKENSTEIN: FRANKENSTEIN_TEXT_PATH,
+}
 
-def pytext() -> None:
-    o = Moby(ORIGINAL, ORIGINAL_TEXT_PATH, LIMITER)
-    train_data = []
-    test_data = []
-    eval_data = []
-    for ch, doc in o.ch_doc.items():
-        for s in doc.sents:
-            r = random.random()
-            if r <= 0.1:
-                eval_data.append(
-                    [
-                        ch,
-                        " ".join(
-                            [
-                                t.lemma_
-                                for t in s
-                                if not t.is_space and not t.is_punct and not t.is_stop
-                            ]
-                        ),
-                    ]
-                )
-            elif r > 0.1 and r <= 0.3:
-                test_data.append(
-                    [
-                        ch,
-                        " ".join(
-                            [
-                                t.lemma_
-                                for t in s
-                                if not t.is_space and not t.is_punct and not t.is_stop
-                            ]
-                        ),
-                    ]
-                )
-            else:
-                train_data.append(
-                    [
-                        ch,
-                        " ".join(
-                            [
-                                t.lemma_
-                                for t in s
-                                if not t.is_space and not t.is_punct and not t.is_stop
-                            ]
-                        ),
-                    ]
-                )
-    with open("/script/moby_nn/train.tsv", "w") as train_fh:
-        writer = csv.writer(train_fh, delimiter="\t")
-        for row in train_data:
-            writer.writerow(row)
-    with open("/script/moby_nn/test.tsv", "w") as test_fh:
-        writer = csv.writer(test_fh, delimiter="\t")
-        for row in test_data:
-            writer.writerow(row)
-    with open("/script/moby_nn/eval.tsv", "w") as test_fh:
-        writer = csv.writer(test_fh, delimiter="\t")
-        for row in eval_data:
-            writer.writerow(row)
-    return None
+
+def _book(title: str, annotations: Set[str], n_process: int = N_PROCESS) -> "Moby":
+    """Builds one of the BOOKS, parsing only what annotations asks for."""
+    from moby import Moby
+
+    return Moby(
+        title, BOOKS[title], LIMITER, CACHE_DIR, n_process, annotations=annotations
+    )
 
 
-def topic() -> None:
-    o = Moby(ORIGINAL, ORIGINAL_TEXT_PATH, LIMITER)
-    a = Moby(ABRIDGED, ABRIDGED_TEXT_PATH, LIMITER)
-    data: List = []
-    data += o.sent_data()
-    data += a.sent_data()
-    df = pd.DataFrame(data)
-
-    bigram_model = gen.models.Phrases(df.loc[:, "unigram_text"])
-    df["bigram_text"] = df["unigram_text"].map(lambda s: "".join(bigram_model[s]))
-    texts = [s.split() for s in list(df["bigram_text"]) if s]
-    dictionary = gen.corpora.Dictionary(texts)
-    dictionary.compactify()
-    corpus = [dictionary.doc2bow(text) for text in texts]
-    log.info(corpus)
-    tfidf = gen.models.TfidfModel(corpus, id2word=dictionary, normalize=True)
-    corpus_tfidf = tfidf[corpus]
-    lda = gen.models.ldamulticore.LdaMulticore(
-        corpus_tfidf, num_topics=3, id2word=dictionary
+def _corpus(
+    manifest: Optional[str],
+    annotations: Set[str],
+    processes: Optional[int] = None,
+    n_process: int = N_PROCESS,
+) -> "Corpus":
+    """
+    Books of a manifest tsv of title and path lines, or the abridged and
+    original books, built side by side by up to processes worker processes,
+    None for every cpu, each parsing with n_process spaCy processes.
+    """
+    from corpus import Corpus, read_manifest
+
+    if manifest is None:
+        books = {title: BOOKS[title] for title in [ABRIDGED, ORIGINAL]}
+    else:
+        books = read_manifest(manifest)
+    return Corpus(books, LIMITER, CACHE_DIR, annotations, processes, n_process)
+
+
+def ingest(
+    paths: Optional[List[str]] = None,
+    out_dir: str = CLEAN_DIR,
+    processes: Optional[int] = None,
+) -> None:
+    """
+    Cleans raw book files, every file matching RAW_PATHS by default, into
+    chapter segmented text in out_dir, one process per file.
+    """
+    import glob
+
+    from ingest import ingest as clean
+
+    paths = paths or sorted(glob.glob(RAW_PATHS))
+    for path, chapters in clean(paths, out_dir, processes):
+        log.info(f"{path}: {chapters} chapters")
+
+
+def pytext(
+    shards: int = 1, processes: Optional[int] = None, n_process: int = N_PROCESS
+) -> None:
+    """
+    Writes the original's sentences as pytext train, test and eval tsv files
+    in moby_nn, split the same way on every run. shards > 1 writes that many
+    numbered sets of files, exported by up to processes worker processes, None
+    for every cpu, each parsing with n_process spaCy processes.
+    """
+    from dataset import export
+
+    export(
+        ORIGINAL,
+        BOOKS[ORIGINAL],
+        "/script/moby_nn",
+        LIMITER,
+        CACHE_DIR,
+        shards,
+        processes,
+        n_process,
     )
     return None
 
 
-def bago() -> None:
-    o = Moby(ORIGINAL, ORIGINAL_TEXT_PATH, LIMITER)
+def topic(
+    num_topics: int = 3,
+    passes: int = 1,
+    workers: Optional[int] = None,
+    n_process: int = N_PROCESS,
+) -> None:
+    """
+    LDA topics of the sentences of the original and abridged books. Models are
+    kept in the output directory and reused until the books or settings change,
+    workers is the number of LDA training processes, None for every cpu but
+    one. Writes the topic distribution of every chapter of both books as tsv.
+    """
+    from topics import TopicModel
+
+    o = _book(ORIGINAL, {"sents", "lemmas"}, n_process)
+    a = _book(ABRIDGED, {"sents", "lemmas"}, n_process)
+    out_dir = f"{OUTPUT_DIR}/topics"
+    model = TopicModel([o, a], out_dir, num_topics, passes, workers).train()
+    for i, words in model.topic_words().items():
+        log.info(f"topic {i}: " + ", ".join(f"{w} {p:0.3f}" for w, p in words))
+    path = f"{out_dir}/chapter_topics.tsv"
+    with span("chapter topics"):
+        model.write_chapter_topics(path)
+    log.info(f"wrote chapter topics to {path}")
+    return None
+
+
+def bago(n_process: int = N_PROCESS) -> None:
+    o = _book(ORIGINAL, {"lemmas"}, n_process)
     texts = []
     for ch, doc in o.ch_doc.items():
         texts.append(
@@ -143,9 +172,9 @@ def bago() -> None:
     return None
 
 
-def vec() -> None:
-    o = Moby(ORIGINAL, ORIGINAL_TEXT_PATH, LIMITER)
-    a = Moby(ABRIDGED, ABRIDGED_TEXT_PATH, LIMITER)
+def vec(n_process: int = N_PROCESS) -> None:
+    o = _book(ORIGINAL, {"tokens"}, n_process)
+    a = _book(ABRIDGED, {"tokens"}, n_process)
     doc = o.ch_doc["chapter_1"]
     good: Set[str] = set()
     unknown: Set[str] = set()
@@ -162,24 +191,83 @@ def vec() -> None:
     return None
 
 
-def sim() -> None:
+def sim(
+    book_a: str = ABRIDGED,
+    book_b: str = FRANKENSTEIN,
+    top_k: int = 3,
+    n_process: int = N_PROCESS,
+) -> None:
+    """
+    Cosine similarity of every chapter of book_a against every chapter of
+    book_b, written to the output directory as a tsv matrix. Logs the top_k
+    closest book_b chapters for each book_a chapter.
+    """
+    from similarity import cosine_matrix
+    from similarity import top_k as nearest
+    from similarity import write_matrix
+
     log.info("similarity by chapter")
-    a = Moby(ABRIDGED, ABRIDGED_TEXT_PATH, LIMITER)
-    # o = Moby(ORIGINAL, ORIGINAL_TEXT_PATH, LIMITER)
-    f = Moby(FRANKENSTEIN, FRANKENSTEIN_TEXT_PATH, LIMITER)
-    for a_ch, a_doc in a.ch_doc.items():
-        log.info("\n")
-        for o_ch, o_doc in f.ch_doc.items():
-            cos = a_doc.similarity(o_doc)
-            log.info(f"A({a_ch}), F({o_ch})\t{cos}")
+    a = _book(book_a, {"tokens"}, n_process)
+    b = _book(book_b, {"tokens"}, n_process)
+    with span("similarity"):
+        matrix = cosine_matrix(a.chapter_vectors(), b.chapter_vectors())
+    a_chapters, b_chapters = list(a.ch_text), list(b.ch_text)
+    path = f"{OUTPUT_DIR}/sim_{book_a}_{book_b}.tsv"
+    write_matrix(path, a_chapters, b_chapters, matrix)
+    log.info(f"wrote {matrix.shape[0]}x{matrix.shape[1]} matrix to {path}")
+    indices, scores = nearest(matrix, top_k)
+    for a_ch, row, row_scores in zip(a_chapters, indices, scores):
+        closest = ", ".join(
+            f"{b_chapters[j]} {score:0.4f}" for j, score in zip(row, row_scores)
+        )
+        log.info(f"{book_a}({a_ch}) {book_b}: {closest}")
 
     return None
 
 
-def freq_data() -> None:
+def align(
+    top_k: int = 3,
+    chapters: int = 3,
+    window: int = 1,
+    threshold: float = 0.9,
+    n_process: int = N_PROCESS,
+) -> None:
+    """
+    Matches every abridged sentence to its top_k most similar sentences of the
+    original, searching the chapters most similar to its own chapter and
+    window chapters either side of them. Writes the matches and how much of
+    each original chapter was kept, a sentence counting as kept when it is the
+    best match of an abridged sentence with a score of at least threshold.
+    """
+    from align import SentenceMatrix
+    from align import align as match
+    from align import coverage, write_alignment
+
+    a = SentenceMatrix.of_book(_book(ABRIDGED, {"sents"}, n_process))
+    o = SentenceMatrix.of_book(_book(ORIGINAL, {"sents"}, n_process))
+    log.info(f"aligning {len(a)} abridged to {len(o)} original sentences")
+    with span("align"):
+        indices, scores = match(a, o, top_k, chapters, window)
+    path = f"{OUTPUT_DIR}/align_{ABRIDGED}_{ORIGINAL}.tsv"
+    write_alignment(path, a, o, indices, scores)
+    log.info(f"wrote sentence matches to {path}")
+    kept = coverage(o, indices[:, 0], scores[:, 0], threshold)
+    path = f"{OUTPUT_DIR}/coverage_{ORIGINAL}.tsv"
+    with open(path, "w") as fh:
+        writer = csv.DictWriter(fh, fieldnames=list(kept[0]), delimiter="\t")
+        writer.writeheader()
+        writer.writerows(kept)
+    for row in kept:
+        log.info(
+            f"{row['chapter']}: {row['coverage']:0.2%} of words kept, "
+            f"{row['kept sentences']} of {row['sentences']} sentences"
+        )
+    return None
+
 
-    a = Moby(ABRIDGED, ABRIDGED_TEXT_PATH, LIMITER)
-    o = Moby(ORIGINAL, ORIGINAL_TEXT_PATH, LIMITER)
+def freq_data(n_process: int = N_PROCESS) -> None:
+    a = _book(ABRIDGED, {"tags"}, n_process)
+    o = _book(ORIGINAL, {"tags"}, n_process)
     search = set(
         [
             "ahab",
@@ -208,19 +296,16 @@ def freq_data() -> None:
     with open("/script/output/freq.json", "w") as fh:
         json.dump(data, fh)
 
-    scatter = []
-    for word in search:
-        o_count = 0
-        a_count = 0
-        for d in data:
-            if d["word"] == word:
-                if d["title"] == "original":
-                    o_count += 1
-                else:
-                    a_count += 1
-        scatter.append(
-            {"word": word.capitalize(), "o_count": o_count, "a_count": a_count}
-        )
+    o_counts = o.freq_counts(search, tag)
+    a_counts = a.freq_counts(search, tag)
+    scatter = [
+        {
+            "word": word.capitalize(),
+            "o_count": o_counts[word],
+            "a_count": a_counts[word],
+        }
+        for word in search
+    ]
 
     with open("/script/output/scatter.json", "w") as fh:
         json.dump(scatter, fh)
@@ -228,114 +313,323 @@ def freq_data() -> None:
     return None
 
 
-def freq_comp() -> None:
+def _write_bins(path: str, rows: List[Dict]) -> None:
+    """Writes chart data, such as pre-binned counts, as json for vega to load."""
+    with open(path, "w") as fh:
+        json.dump(rows, fh, separators=(",", ":"))
+
+
+def _groups(terms: Any) -> List[List[str]]:
+    """
+    Term groups from the command line, where a single term is its own group.
+    fire passes --terms=ahab as the term itself rather than a list of it.
+    """
+    if not isinstance(terms, (list, tuple)):
+        terms = [terms]
+    return [
+        [str(t) for t in term] if isinstance(term, (list, tuple)) else [str(term)]
+        for term in terms
+    ]
+
+
+def freq_comp(
+    terms: Optional[List[Any]] = None,
+    bins: int = 10,
+    processes: Optional[int] = None,
+    n_process: int = N_PROCESS,
+) -> None:
+    """
+    A histogram over the normalized index per term or group of terms, e.g.
+    --terms='[ahab,stubb,[flask,pip]]' makes three charts. The books are
+    loaded and scanned once for all of them and the charts are rendered by up
+    to processes worker processes, None for every cpu.
+    """
+    from charts import render
+    from histogram import merge_rows
+
     log.info("collecting frequency counts")
-    a = Moby(ABRIDGED, ABRIDGED_TEXT_PATH, LIMITER)
-    o = Moby(ORIGINAL, ORIGINAL_TEXT_PATH, LIMITER)
-    search = set(["daggoo"])
-    search_title = "_".join(search)
+    a = _book(ABRIDGED, {"tags"}, n_process)
+    o = _book(ORIGINAL, {"tags"}, n_process)
+    groups = _groups(terms or ["daggoo"])
+    search = set(word for group in groups for word in group)
     tag = "NNP"
-    data = alt.Data(values=(a.freq(search, tag) + o.freq(search, tag)))
-    alt.Chart(data).mark_bar().encode(
-        x=alt.X(
-            title="normalized index",
-            bin={"extent": [0, 1]},
-            field="norm_index",
-            type="quantitative",
-        ),
-        y=alt.Y(title=f"{search_title} count", aggregate="count", type="quantitative"),
-        row=alt.Row(field="title", type="nominal"),
-    ).save(f"{OUTPUT_DIR}/{search_title}_hist.html")
+    # counted into bins here so the charts carry bins rather than every hit
+    rows = a.freq_bins(search, tag, bins=bins) + o.freq_bins(search, tag, bins=bins)
+    jobs = []
+    for group in groups:
+        name = "_".join(sorted(group))
+        group_rows = merge_rows((r for r in rows if r["word"] in group), ["title"])
+        jobs.append(("index", group_rows, name, f"{OUTPUT_DIR}/{name}_hist.html"))
+    with span("render charts"):
+        render(jobs, processes)
     return None
 
 
-def freq_missing() -> None:
+def freq_missing(
+    terms: Optional[List[Any]] = None,
+    bins: Optional[int] = None,
+    processes: Optional[int] = None,
+    n_process: int = N_PROCESS,
+) -> None:
+    """
+    Chapter histograms of the original, a chart per group of terms with a row
+    per term, see freq_comp for terms and processes. bins is the number of
+    chapter bins, None is one bin per chapter.
+    """
+    from charts import render
+
     log.info("collecting frequency counts")
-    o = Moby(ORIGINAL, ORIGINAL_TEXT_PATH, LIMITER)
-    search = set(["jonah", "bildad", "pip", "sperm", "right", "greenland"])
-    title = "_".join(sorted(search))
+    o = _book(ORIGINAL, {"tags"}, n_process)
+    groups = _groups(
+        terms or [["jonah", "bildad", "pip", "sperm", "right", "greenland"]]
+    )
+    search = set(word for group in groups for word in group)
     tag = "NNP"
-    data = alt.Data(values=(o.freq(search, tag)))
-    alt.Chart(data, width=1000).mark_bar().encode(
-        x=alt.X(
-            title="Chapter",
-            bin={"extent": [1, 135], "step": 1},
-            field="chapter",
-            type="quantitative",
-        ),
-        y=alt.Y(title=f"word count", aggregate="count", type="quantitative"),
-        row=alt.Row(field="word", type="nominal"),
-    ).save(f"{OUTPUT_DIR}/{title}_index_hist.html")
+    rows = o.freq_bins(search, tag, by="chapter", bins=bins)
+    jobs = []
+    for group in groups:
+        title = "_".join(sorted(group))
+        group_rows = [r for r in rows if r["word"] in group]
+        path = f"{OUTPUT_DIR}/{title}_index_hist.html"
+        jobs.append(("chapter", group_rows, title, path))
+    with span("render charts"):
+        render(jobs, processes)
+    return None
+
+
+def readability(
+    window: int = 5000,
+    step: Optional[int] = None,
+    processes: Optional[int] = None,
+    n_process: int = N_PROCESS,
+) -> None:
+    """
+    Readability of both books per chapter and over windows of window tokens
+    every step tokens, half a window by default. Writes the rows as json and a
+    chapter and a window chart per score, rendered by up to processes workers.
+    """
+    from charts import render
+    from readability import SCORES
+
+    a = _book(ABRIDGED, {"sents"}, n_process)
+    o = _book(ORIGINAL, {"sents"}, n_process)
+    chapters = a.readability() + o.readability()
+    windows = a.readability(window, step) + o.readability(window, step)
+    _write_bins(f"{OUTPUT_DIR}/readability_chapters.json", chapters)
+    _write_bins(f"{OUTPUT_DIR}/readability_windows.json", windows)
+    jobs = []
+    for score in SCORES:
+        path = f"{OUTPUT_DIR}/{score}_chapters.html"
+        jobs.append(("chapter line", chapters, score, path))
+        jobs.append(
+            ("index line", windows, score, f"{OUTPUT_DIR}/{score}_windows.html")
+        )
+    with span("render charts"):
+        render(jobs, processes)
     return None
 
 
-def propn() -> None:
+def _write_rows(path: str, rows: List[Dict[str, Any]]) -> None:
+    """Writes rows of the same keys as tsv, with the keys as header."""
+    with open(path, "w") as fh:
+        fields = list(rows[0]) if rows else []
+        writer = csv.DictWriter(fh, fieldnames=fields, delimiter="\t")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def ngrams(
+    n: int = 2,
+    column: str = "lemma",
+    pos: Optional[List[str]] = None,
+    stop: bool = True,
+    min_count: int = 3,
+    top: int = 25,
+    manifest: Optional[str] = None,
+    n_process: int = N_PROCESS,
+) -> None:
+    """
+    Counts the n-grams of up to n words of every book of a manifest, or of
+    BOOKS, and writes each book's n word collocations, plus the n-grams of
+    the original with how much the abridged book cut them. column is lemma,
+    lower for surface forms or norm, which also folds curly quotes. pos keeps
+    only words with those parts of speech, e.g. --pos='[ADJ,NOUN,PROPN]', and
+    --nostop leaves out stop words. N-grams seen fewer than min_count times
+    are not written. Counts are cached, books are counted one at a time.
+    """
+    from corpus import read_manifest
+    from moby import Moby
+    from ngrams import NGrams, collocations, diff
+
+    books = BOOKS if manifest is None else read_manifest(manifest)
+    counted: Dict[str, NGrams] = {}
+    for title, path in books.items():
+        book = Moby(
+            title, path, LIMITER, CACHE_DIR, n_process, annotations={"lemmas", "sents"}
+        )
+        grams = NGrams.of_book(book, n, column, set(pos) if pos else None, stop)
+        rows = collocations(grams, n, min_count)
+        _write_rows(f"{OUTPUT_DIR}/ngrams_{title}_{n}.tsv", rows)
+        log.info(f"top {title} {n}-gram collocations")
+        for row in rows[:top]:
+            log.info(f"{row['ngram']}: {row['count']} pmi {row['pmi']:0.2f}")
+        if title in (ORIGINAL, ABRIDGED):
+            counted[title] = grams
+    if len(counted) == 2:
+        rows = diff(counted[ORIGINAL], counted[ABRIDGED], n, min_count)
+        _write_rows(f"{OUTPUT_DIR}/ngrams_cut_{n}.tsv", rows)
+        log.info(f"{n}-grams of the original most cut from the abridged")
+        for row in rows[:top]:
+            log.info(f"{row['ngram']}: {row['original']} to {row['abridged']}")
+    return None
+
+
+def propn(
+    manifest: Optional[str] = None,
+    processes: Optional[int] = None,
+    n_process: int = N_PROCESS,
+) -> None:
+    import pandas as pd  # type: ignore
+
+    from corpus import top_by
+
     log.info("collecting proper nouns")
     pd.set_option("display.max_rows", 500)
-    a = Moby(ABRIDGED, ABRIDGED_TEXT_PATH, LIMITER)
-    o = Moby(ORIGINAL, ORIGINAL_TEXT_PATH, LIMITER)
-    combined: Dict[str, Dict[str, int]] = defaultdict(
-        lambda: {"original": 0, "abridged": 0}
-    )
-    for noun, count in a.propn().items():
-        combined[noun]["abridged"] += count
-    for noun, count in o.propn().items():
-        combined[noun]["original"] += count
-    top_a = sorted(
-        combined.items(), key=lambda kv: kv[1].get("abridged", 0), reverse=True
-    )
-    result = pd.DataFrame(top_a)
-    log.info(f"top abridged proper nouns\n{result}")
-    top_o = sorted(
-        combined.items(), key=lambda kv: kv[1].get("original", 0), reverse=True
-    )
-    result = pd.DataFrame(top_o)
-    log.info(f"top original proper nouns\n{result}")
+    corpus = _corpus(manifest, {"lemmas"}, processes, n_process)
+    combined = corpus.propn()
+    for title in corpus.manifest:
+        result = pd.DataFrame(top_by(combined, title))
+        log.info(f"top {title} proper nouns\n{result}")
     return None
 
 
-def verb() -> None:
-    log.info("collecting proper nouns")
+def verb(
+    manifest: Optional[str] = None,
+    processes: Optional[int] = None,
+    n_process: int = N_PROCESS,
+) -> None:
+    import pandas as pd  # type: ignore
+
+    from corpus import top_by
+
+    log.info("collecting verbs")
     pd.set_option("display.max_rows", 100)
-    a = Moby(ABRIDGED, ABRIDGED_TEXT_PATH, LIMITER)
-    o = Moby(ORIGINAL, ORIGINAL_TEXT_PATH, LIMITER)
-    combined: Dict[str, Dict[str, int]] = defaultdict(
-        lambda: {"original": 0, "abridged": 0}
-    )
-    for verb, count in a.verb().items():
-        combined[verb]["abridged"] += count
-    for verb, count in o.verb().items():
-        combined[verb]["original"] += count
-    top_a = sorted(
-        combined.items(), key=lambda kv: kv[1].get("abridged", 0), reverse=True
-    )
-    result = pd.DataFrame(top_a)
-    log.info(f"top abridged verbs\n{result}")
-    top_o = sorted(
-        combined.items(), key=lambda kv: kv[1].get("original", 0), reverse=True
-    )
-    result = pd.DataFrame(top_o)
-    log.info(f"top original verbs\n{result}")
+    corpus = _corpus(manifest, {"lemmas"}, processes, n_process)
+    combined = corpus.verb()
+    for title in corpus.manifest:
+        result = pd.DataFrame(top_by(combined, title))
+        log.info(f"top {title} verbs\n{result}")
     return None
 
 
-def table() -> None:
+def table(
+    manifest: Optional[str] = None,
+    processes: Optional[int] = None,
+    n_process: int = N_PROCESS,
+) -> None:
+    import pandas as pd  # type: ignore
+
     log.info("building statistics table")
-    a = Moby(ABRIDGED, ABRIDGED_TEXT_PATH, LIMITER)
-    o = Moby(ORIGINAL, ORIGINAL_TEXT_PATH, LIMITER)
-    result = pd.DataFrame(
-        [a.statistics(), o.statistics()], index=["Abridged", "Original"]
-    )
+    corpus = _corpus(manifest, {"sents"}, processes, n_process)
+    index = [title.capitalize() for title in corpus.manifest]
+    result = pd.DataFrame(list(corpus.statistics().values()), index=index)
     log.info("statistics\n" + str(result.T))
-    result = pd.DataFrame([a.indexes(), o.indexes()], index=["Abridged", "Original"])
+    result = pd.DataFrame(list(corpus.indexes().values()), index=index)
     log.info("indexes\n" + str(result.T))
     return None
 
 
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    manifest: Optional[str] = None,
+    processes: Optional[int] = None,
+    warm: bool = True,
+) -> None:
+    """
+    Answers table, propn, verb, freq and sim queries over HTTP as json, with
+    the books of a manifest, or BOOKS, parsed once by up to processes workers
+    and kept in memory, see server.py. warm loads every book at startup
+    rather than on its first query, e.g.
+    curl 'localhost:8000/freq?titles=abridged,original&words=ahab,pip&bins=10'
+    """
+    import asyncio
+
+    from corpus import read_manifest
+    from server import Server
+
+    books = BOOKS if manifest is None else read_manifest(manifest)
+    server = Server(books, LIMITER, CACHE_DIR, processes)
+    try:
+        asyncio.run(server.serve(host, port, warm))
+    except KeyboardInterrupt:
+        log.info("stopped serving")
+    finally:
+        server.close()
+
+
+def trace(
+    command: str,
+    *args: Any,
+    out: str = f"{OUTPUT_DIR}/trace.json",
+    cprofile: Optional[str] = None,
+    memory: bool = False,
+    **kwargs: Any,
+) -> None:
+    """
+    Runs another command with its stages traced and writes the trace as json
+    to out. Parsing is traced per chapter and per spaCy component, in this
+    process. memory adds Python heap usage to every span, cprofile is a path
+    to dump cProfile stats to. The command's own flags pass through, e.g.
+    python main.py trace freq_data --n_process=2 --cprofile=/script/output/f.prof
+    """
+    import cProfile
+
+    run = globals().get(command)
+    if command == "trace" or not callable(run):
+        raise ValueError(f"unknown command {command}")
+    profiler = cProfile.Profile()
+    with tracing(memory) as t:
+        if cprofile:
+            profiler.enable()
+        try:
+            with span(command):
+                run(*args, **kwargs)
+        finally:
+            if cprofile:
+                profiler.disable()
+                profiler.dump_stats(cprofile)
+                log.info(f"wrote cProfile stats to {cprofile}")
+            t.write(out)
+    log.info(f"wrote {len(t.events)} spans to {out}")
+    summary = sorted(t.summary().items(), key=lambda kv: -kv[1]["seconds"])
+    for name, total in summary[:20]:
+        log.info(f"{name}: {total['seconds']:0.3f}s over {total['count']:0.0f}")
+
+
 def noop() -> None:
     log.info("No operation.")
 
 
+def startup() -> None:
+    """Times the one off costs that commands pay before doing any work."""
+    timings: Dict[str, float] = {}
+    for name in ["moby", "pandas", "altair", "gensim"]:
+        start = time.perf_counter()
+        __import__(name)
+        timings[f"import {name}"] = time.perf_counter() - start
+    import moby
+
+    start = time.perf_counter()
+    moby.load_nlp()
+    timings[f"load {moby.MODEL}"] = time.perf_counter() - start
+    start = time.perf_counter()
+    moby.load_phonemes()
+    timings["load cmudict"] = time.perf_counter() - start
+    for stage, seconds in timings.items():
+        log.info(f"{stage}: {seconds:0.3f}s")
+
+
 if __name__ == "__main__":
     logging.basicConfig(
         stream=sys.stdout,
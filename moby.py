@@ -1,69 +1,751 @@
+import json
 import logging
+import os
 import re
 import string
 from collections import Counter
-from functools import lru_cache
-from typing import Any, Dict, List, Optional, Set
+from functools import lru_cache, wraps
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    ItemsView,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    ValuesView,
+)
 
 import cmudict  # type: ignore
 import numpy  # type: ignore
 import spacy  # type: ignore
 from spacy import attrs, tokens, vocab
+from spacy.pipeline import Sentencizer  # type: ignore
 
-# Average reading speeds of people.
-CHILD_WPM = 180
-ADULT_WPM = 265
+from cache import Cache, MetricsCache, digest
+from histogram import bin_counts, bin_edges, bin_rows
+from instrument import active, span, timed
+from readability import ADULT_WPM, CHILD_WPM, PrefixCounts, profile, windows
+from tokentable import FreqIndex, TokenTable
+from vectorstore import Vectors, VectorStore
+from workers import pool_size
+
+# Chapters handed to each nlp.pipe worker at a time, chapters are long so keep
+# this small enough that every worker gets a share of a book.
+BATCH_SIZE = 4
 
 log = logging.getLogger("moby")
 
-_nlp: spacy.lang.en.English = spacy.load("en_core_web_lg")
-# _nlp: spacy.lang.en.English = spacy.load("en_core_web_sm")
+MODEL = "en_core_web_lg"
+# MODEL = "en_core_web_sm"
+
+
+@lru_cache(maxsize=None)
+@timed("load model")
+def load_nlp() -> spacy.language.Language:
+    """The process wide pipeline, loaded the first time anything needs it."""
+    log.info(f"loading {MODEL}")
+    return spacy.load(MODEL)
+
+
+@lru_cache(maxsize=None)
+def model_meta() -> Dict[str, Any]:
+    """
+    The meta.json of MODEL, read without loading the pipeline. It names the
+    components and the version, which is all cache keys need.
+    """
+    if spacy.util.is_package(MODEL):
+        return spacy.util.get_model_meta(spacy.util.get_package_path(MODEL))
+    # a model directory, which spacy.load accepts too
+    return spacy.util.get_model_meta(MODEL)
+
+
+@lru_cache(maxsize=None)
+@timed("load cmudict")
+def load_phonemes() -> Dict:
+    """The cmu phoneme dictionary, handy for syllable counting."""
+    return cmudict.dict()
+
+
+# The pipeline components each kind of annotation depends on, named after the
+# en_core_web pipelines. Sentences come from the parser when parsing anyway and
+# otherwise from a rule based sentencizer. Tokens, lexical attributes such as
+# is_stop and word vectors need no components at all.
+ANNOTATIONS: Dict[str, Set[str]] = {
+    "tokens": set(),
+    "sents": set(),
+    "tags": {"tok2vec", "tagger", "attribute_ruler"},
+    "lemmas": {"tok2vec", "tagger", "attribute_ruler", "lemmatizer"},
+    "parse": {"tok2vec", "parser"},
+    "ents": {"tok2vec", "ner"},
+}
+SENTENCIZER = "sentencizer"
+
+
+class Syllables:
+    """
+    Syllables per word type. Every cmudict word is counted up front from its
+    first pronunciation, other words fall back to Moby.naive_syl the first time
+    they are seen and are remembered after that.
+    """
+
+    # bump when the counting rules change so persisted tables are rebuilt
+    VERSION = "1"
+
+    def __init__(self, known: Dict[str, int]):
+        self.known = known
+
+    def __getitem__(self, word: str) -> int:
+        n = self.known.get(word)
+        if n is None:
+            n = self.known[word] = Moby.naive_syl(word)
+        return n
+
+    def count(self, words: Iterable[str]) -> numpy.ndarray:
+        return numpy.fromiter((self[word] for word in words), dtype="int64")
+
+    @classmethod
+    def from_cmudict(cls) -> "Syllables":
+        return cls({word: Moby.cmu_syl(word) for word in load_phonemes()})
+
+    def to_bytes(self) -> bytes:
+        return json.dumps(self.known).encode("utf-8")
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Syllables":
+        return cls(json.loads(data.decode("utf-8")))
+
+
+def syllables_version() -> str:
+    """Identifies the syllable counts, the cmudict release and the rules."""
+    return f"{getattr(cmudict, '__version__', '')}|{Syllables.VERSION}"
+
+
+@lru_cache(maxsize=None)
+@timed("load syllables")
+def load_syllables(cache_dir: Optional[str] = None) -> Syllables:
+    """
+    The process wide syllable table. With a cache directory the table is kept
+    there, so later runs skip loading cmudict altogether.
+    """
+    if cache_dir is None:
+        return Syllables.from_cmudict()
+    cache = Cache(cache_dir)
+    key = digest("syllables", getattr(cmudict, "__version__", ""), Syllables.VERSION)
+    data = cache.get(key, "json")
+    if data is not None:
+        return Syllables.from_bytes(data)
+    syllables = Syllables.from_cmudict()
+    cache.put(key, "json", syllables.to_bytes())
+    return syllables
+
+
+def check_annotations(annotations: Set[str]) -> None:
+    unknown = annotations - ANNOTATIONS.keys()
+    if unknown:
+        raise ValueError(f"unknown annotations {sorted(unknown)}")
+
+
+def pipeline_for(annotations: Optional[Set[str]]) -> List[str]:
+    """
+    Names of the components needed for the annotations in pipeline order, with
+    the sentencizer appended when sentences are wanted without a parse. None
+    asks for the whole pipeline. The names come from the model's meta, so the
+    model is not loaded.
+    """
+    meta = model_meta()
+    disabled = set(meta.get("disabled", []))
+    pipe_names = [name for name in meta["pipeline"] if name not in disabled]
+    if annotations is None:
+        return pipe_names
+    check_annotations(annotations)
+    needed: Set[str] = set()
+    for annotation in annotations:
+        needed |= ANNOTATIONS[annotation]
+    pipes = [name for name in pipe_names if name in needed]
+    if "sents" in annotations and "parser" not in pipes:
+        pipes.append(SENTENCIZER)
+    return pipes
+
+
+def pipeline_fingerprint(meta: Dict[str, Any], pipes: List[str]) -> str:
+    """Identifies everything besides the text that determines a parsed doc."""
+    return "|".join(
+        [
+            spacy.__version__,
+            f"{meta.get('lang')}_{meta.get('name')}-{meta.get('version')}",
+            ",".join(pipes),
+        ]
+    )
+
+
+CHAPTER_PATTERN = re.compile(r"(CHAPTER \d\d?\d?)", re.IGNORECASE)
+
+
+def chapter_spans(
+    path: str, limiter: Optional[int] = None
+) -> Iterator[Tuple[str, int, int]]:
+    """
+    Scans a book a line at a time and yields the key and the byte range of the
+    text of each chapter, whatever precedes the first heading is tossed. A
+    heading never spans lines, so this splits exactly like a regex split over
+    the whole file without ever holding more than a line.
+    limiter truncates the number of chapters for faster feedback.
+    """
+    chapter: Optional[str] = None
+    start = offset = found = 0
+    with open(path, "rb") as f:
+        for raw in f:
+            line = raw.decode("utf-8")
+            for m in CHAPTER_PATTERN.finditer(line):
+                heading_start = offset + len(line[: m.start()].encode("utf-8"))
+                if chapter is not None:
+                    yield chapter, start, heading_start
+                found += 1
+                if limiter and found > limiter:
+                    return
+                chapter = m.group(1).replace(" ", "_").lower()
+                start = offset + len(line[: m.end()].encode("utf-8"))
+            offset += len(raw)
+    if chapter is not None:
+        yield chapter, start, offset
+
+
+def read_span(path: str, start: int, end: int) -> str:
+    """Text of a byte range of a file with newlines translated like open()."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8")
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def read_chapters(
+    path: str, limiter: Optional[int] = None
+) -> Iterator[Tuple[str, str]]:
+    """Streams the (chapter key, text) pairs of a book one chapter at a time."""
+    for chapter, start, end in chapter_spans(path, limiter):
+        yield chapter, read_span(path, start, end)
+
+
+class ChapterText(Mapping[str, str]):
+    """
+    Chapter texts of a book file by chapter key. Only the byte range of each
+    chapter is kept, the text is read from disk whenever it is looked up. A
+    repeated chapter key keeps its first position and its last text, like
+    building a dict from the chapters would.
+    """
+
+    def __init__(self, path: str, limiter: Optional[int] = None):
+        self.path = path
+        self.spans: Dict[str, Tuple[int, int]] = {}
+        with span("split chapters", path=path) as fields:
+            for chapter, start, end in chapter_spans(path, limiter):
+                self.spans[chapter] = (start, end)
+            fields["chapters"] = len(self.spans)
+
+    def __getitem__(self, chapter: str) -> str:
+        return read_span(self.path, *self.spans[chapter])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.spans)
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    def __contains__(self, chapter: object) -> bool:
+        return chapter in self.spans
+
+
+def doc_to_bytes(doc: tokens.doc.Doc) -> bytes:
+    return tokens.DocBin(docs=[doc], store_user_data=False).to_bytes()
+
+
+def doc_from_bytes(data: bytes, vocab: vocab.Vocab) -> tokens.doc.Doc:
+    return next(tokens.DocBin().from_bytes(data).get_docs(vocab))
+
+
+class ChapterDocs(Mapping[str, tokens.doc.Doc]):
+    """
+    Chapter docs keyed like the chapter texts, each one parsed the first time it
+    is looked up and kept afterwards. Iterating values or items parses all of
+    the outstanding chapters together so they still share nlp.pipe batches.
+    Only the components the requested annotations need are run. stream goes
+    through the docs without keeping them, for analyses that must stay within
+    bounded memory.
+    """
+
+    def __init__(
+        self,
+        ch_text: Mapping[str, str],
+        cache: Optional[Cache] = None,
+        n_process: int = 1,
+        batch_size: int = BATCH_SIZE,
+        annotations: Optional[Set[str]] = None,
+    ):
+        self.ch_text = ch_text
+        self.cache = cache
+        self.n_process = n_process
+        self.batch_size = batch_size
+        if annotations is not None:
+            check_annotations(annotations)
+        self.annotations = annotations
+        self._pipes: Optional[List[str]] = None
+        self._fingerprint: Optional[str] = None
+        self._keys: Dict[str, str] = {}
+        self._docs: Dict[str, tokens.doc.Doc] = {}
+
+    @property
+    def pipes(self) -> List[str]:
+        # resolved against the model on first use so construction stays cheap
+        if self._pipes is None:
+            self._pipes = pipeline_for(self.annotations)
+        return self._pipes
+
+    def key(self, chapter: str) -> str:
+        """Cache key of a chapter's doc and of anything derived from it alone."""
+        if chapter not in self._keys:
+            if self._fingerprint is None:
+                self._fingerprint = pipeline_fingerprint(model_meta(), self.pipes)
+            self._keys[chapter] = digest(self._fingerprint, self.ch_text[chapter])
+        return self._keys[chapter]
+
+    def updated(self, ch_text: Mapping[str, str]) -> "ChapterDocs":
+        """
+        Docs for a new version of the chapter texts with the same settings,
+        keeping the parsed docs of chapters whose text did not change.
+        """
+        docs = ChapterDocs(
+            ch_text, self.cache, self.n_process, self.batch_size, self.annotations
+        )
+        for chapter, doc in self._docs.items():
+            if chapter in ch_text and docs.key(chapter) == self._keys.get(chapter):
+                docs._docs[chapter] = doc
+        return docs
+
+    def __getitem__(self, chapter: str) -> tokens.doc.Doc:
+        if chapter not in self._docs:
+            self.materialize([chapter])
+        return self._docs[chapter]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.ch_text)
+
+    def __len__(self) -> int:
+        return len(self.ch_text)
 
-# Handy for syllable counting.
-phoneme_dict: Dict = cmudict.dict()
+    def __contains__(self, chapter: object) -> bool:
+        # membership must not trigger a parse
+        return chapter in self.ch_text
+
+    def values(self) -> ValuesView[tokens.doc.Doc]:
+        self.materialize()
+        return super().values()
+
+    def items(self) -> ItemsView[str, tokens.doc.Doc]:
+        self.materialize()
+        return super().items()
+
+    def materialize(self, chapters: Optional[Iterable[str]] = None) -> None:
+        """Parses the given chapters, or all of them, unless already parsed."""
+        if chapters is None:
+            chapters = self.ch_text
+        pending = [chapter for chapter in chapters if chapter not in self._docs]
+        if pending:
+            log.info(f"generating {len(pending)} chapters")
+            self._docs.update(self._parse(pending))
+
+    def stream(
+        self, chapters: Optional[Iterable[str]] = None
+    ) -> Iterator[Tuple[str, tokens.doc.Doc]]:
+        """
+        Yields (chapter, doc) for the given chapters, or all of them, in order
+        without keeping the docs. Parsing happens a few nlp.pipe batches at a
+        time so only those docs are ever in memory together.
+        """
+        if chapters is None:
+            chapters = self.ch_text
+        workers = pool_size(self.n_process)
+        size = self.batch_size * workers
+        chapters = list(chapters)
+        for i in range(0, len(chapters), size):
+            chunk = chapters[i : i + size]
+            parsed = dict(self._parse([ch for ch in chunk if ch not in self._docs]))
+            for chapter in chunk:
+                if chapter in self._docs:
+                    yield chapter, self._docs[chapter]
+                else:
+                    yield chapter, parsed[chapter]
+
+    def _sentencize(self, doc: tokens.doc.Doc) -> tokens.doc.Doc:
+        """
+        Rule based sentence boundaries. The sentencizer starts a new sentence at
+        the whitespace after a full stop, the parser attaches that whitespace to
+        the sentence before it, so move those starts onto the next word.
+        """
+        with span("component sentencizer"):
+            doc = Sentencizer()(doc)
+        pending = False
+        for t in doc[1:]:
+            if t.is_space and t.is_sent_start:
+                t.is_sent_start = False
+                pending = True
+            elif pending and not t.is_space:
+                t.is_sent_start = True
+                pending = False
+        return doc
+
+    def _pipe_traced(
+        self, nlp: spacy.language.Language, chapters: List[str]
+    ) -> Iterator[tokens.doc.Doc]:
+        """
+        What nlp.pipe does, one chapter and one component at a time so that
+        each is timed on its own. Always runs in this process, as spans of
+        worker processes would be lost.
+        """
+        for chapter in chapters:
+            with span("parse chapter", chapter=chapter) as fields:
+                with span("component tokenizer"):
+                    doc = nlp.make_doc(self.ch_text[chapter])
+                for name, component in nlp.pipeline:
+                    if name in self.pipes:
+                        with span(f"component {name}"):
+                            doc = component(doc)
+                fields["tokens"] = len(doc)
+            yield doc
+
+    def _parse(self, chapters: List[str]) -> Iterator[Tuple[str, tokens.doc.Doc]]:
+        """
+        Make docs for each chapter. With a cache, docs are keyed by the chapter
+        text and pipeline fingerprint so an edited text or a different model
+        misses and gets reparsed. Misses are streamed through nlp.pipe so they
+        are batched and optionally spread over n_process workers.
+        """
+        cache = self.cache
+        nlp = load_nlp()
+        cached: Dict[str, tokens.doc.Doc] = {}
+        if cache is not None:
+            with span("load cached docs") as fields:
+                for chapter in chapters:
+                    data = cache.get(self.key(chapter), "spacy")
+                    if data is not None:
+                        cached[chapter] = doc_from_bytes(data, nlp.vocab)
+                fields["chapters"] = len(cached)
+            log.debug(
+                f"loaded {len(cached)} of {len(chapters)} chapters from {cache.root}"
+            )
+        misses = [chapter for chapter in chapters if chapter not in cached]
+        if active() is None:
+            docs = nlp.pipe(
+                (self.ch_text[chapter] for chapter in misses),
+                batch_size=self.batch_size,
+                disable=[name for name in nlp.pipe_names if name not in self.pipes],
+                # a worker pool is not worth starting for a single chapter
+                n_process=self.n_process if len(misses) > 1 else 1,
+            )
+        else:
+            docs = self._pipe_traced(nlp, misses)
+        parsed: Dict[str, tokens.doc.Doc] = {}
+        with span("parse chapters", chapters=len(misses)) as fields:
+            for chapter, doc in zip(misses, docs):
+                if SENTENCIZER in self.pipes:
+                    doc = self._sentencize(doc)
+                parsed[chapter] = doc
+                if cache is not None:
+                    with span("store doc"):
+                        cache.put(self.key(chapter), "spacy", doc_to_bytes(doc))
+            fields["tokens"] = sum(len(doc) for doc in parsed.values())
+        # keep the chapter order of the text regardless of what was cached
+        for chapter in chapters:
+            yield chapter, cached[chapter] if chapter in cached else parsed[chapter]
+
+
+class Totals:
+    """
+    Counts that add up across chapters, so the totals of a book can be kept up
+    to date by subtracting an edited chapter's old counts and adding its new.
+    """
+
+    def __init__(
+        self,
+        tokens: int = 0,
+        letters: int = 0,
+        words: int = 0,
+        sentences: int = 0,
+        syllables: int = 0,
+        propn: Optional[Counter] = None,
+        verb: Optional[Counter] = None,
+    ):
+        self.tokens = tokens
+        self.letters = letters
+        self.words = words
+        self.sentences = sentences
+        self.syllables = syllables
+        self.propn = propn if propn is not None else Counter()
+        self.verb = verb if verb is not None else Counter()
+
+    @classmethod
+    def of(cls, t: TokenTable, syllables: Syllables) -> "Totals":
+        words = t.words
+        # each distinct word is looked up once and weighted by its occurrences
+        types, counts = numpy.unique(t.norm[words], return_counts=True)
+        per_type = syllables.count(t.strings[int(h)] for h in types)
+        return cls(
+            tokens=len(t),
+            letters=int(t.length[words].sum()),
+            words=int(words.sum()),
+            sentences=t.count_sentences(),
+            syllables=int(per_type @ counts),
+            propn=Counter(t.counts("lemma", t.tag == t.hash_of("NNP"))),
+            verb=Counter(t.counts("lemma", t.pos == t.hash_of("VERB"))),
+        )
+
+    def __add__(self, other: "Totals") -> "Totals":
+        return Totals(
+            self.tokens + other.tokens,
+            self.letters + other.letters,
+            self.words + other.words,
+            self.sentences + other.sentences,
+            self.syllables + other.syllables,
+            self.propn + other.propn,
+            self.verb + other.verb,
+        )
+
+    def __sub__(self, other: "Totals") -> "Totals":
+        return Totals(
+            self.tokens - other.tokens,
+            self.letters - other.letters,
+            self.words - other.words,
+            self.sentences - other.sentences,
+            self.syllables - other.syllables,
+            self.propn - other.propn,
+            self.verb - other.verb,
+        )
+
+
+def metric(method: Callable[["Moby"], Any]) -> Callable[["Moby"], Any]:
+    """Memoizes a Moby method without arguments in the book's metrics cache."""
+
+    @wraps(method)
+    def wrapper(self: "Moby") -> Any:
+        return self._metric(method.__name__, method)
+
+    return wrapper
 
 
 class Moby:
     """
     Base class for source texts.
+
+    annotations restricts parsing to what an analysis reads, see ANNOTATIONS,
+    e.g. {"sents"} for the counts or {"lemmas"} for propn and verb. None runs
+    the whole pipeline.
     """
 
-    def __init__(self, title: str, text_path: str, limiter: Optional[int] = None):
-        text = self._load_text(text_path)
+    def __init__(
+        self,
+        title: str,
+        text_path: str,
+        limiter: Optional[int] = None,
+        cache_dir: Optional[str] = None,
+        n_process: int = 1,
+        batch_size: int = BATCH_SIZE,
+        annotations: Optional[Set[str]] = None,
+    ):
         self.title = title
-        self.ch_text = self._split_by_chapter(text, limiter)
-        self.ch_doc = self._make_ch_doc(self.ch_text)
+        self.text_path = text_path
+        self.limiter = limiter
+        self.cache = Cache(cache_dir) if cache_dir else None
+        # embeddings are kept apart from the blobs so workers can mmap them
+        self.vector_store = (
+            VectorStore(os.path.join(cache_dir, "vectors")) if cache_dir else None
+        )
+        self.ch_text = ChapterText(text_path, limiter)
+        self.ch_doc = ChapterDocs(
+            self.ch_text, self.cache, n_process, batch_size, annotations
+        )
+        self._token_table: Optional[TokenTable] = None
+        self._freq_index: Optional[FreqIndex] = None
+        # chapter keys the token table was built from, None when unknown
+        self._table_keys: Optional[Dict[str, str]] = None
+        self._totals: Optional[Totals] = None
+        self._chapter_totals: Dict[str, Totals] = {}
+        self._prefix_counts: Optional[PrefixCounts] = None
+        self.metrics = MetricsCache()
 
-    @staticmethod
-    def _split_by_chapter(text: str, limiter: Optional[int]) -> Dict[str, str]:
-        p = re.compile(r"(CHAPTER \d\d?\d?)", re.IGNORECASE)
-        # split and toss the first title item
-        # limiter truncates the number of chapters for faster feedback
-        if limiter:
-            sp = p.split(text)[1 : (2 * limiter + 1)]
-        else:
-            sp = p.split(text)[1:]
-        # odd items are chapters, even is the text
-        # construct dictionary with chapters keyed to dict for the text and doc
-        chapters = dict(zip([s.replace(" ", "_").lower() for s in sp[::2]], sp[1::2]))
-        return chapters
+    def _metric(self, name: str, method: Callable[["Moby"], Any]) -> Any:
+        if self.cache is not None and not self.metrics.bound:
+            self.metrics.bind(self.cache, self.metrics_key())
+        if name not in self.metrics:
+            with span(f"metric {name}"):
+                self.metrics[name] = method(self)
+        return self.metrics[name]
 
-    @staticmethod
-    def _load_text(path: str) -> str:
-        """Loads and reads the book file."""
-        with open(path, "r") as f:
-            text = f.read()
-        return text
+    def key(self) -> str:
+        """Cache key of artifacts derived from the whole book."""
+        return digest(*[self.ch_doc.key(chapter) for chapter in self.ch_text])
 
-    @staticmethod
-    def _make_ch_doc(ch_text: Dict[str, str]) -> Dict[str, tokens.doc.Doc]:
-        """Make docs for each chapter."""
-        log.info(f"generating {len(ch_text)} chapters")
-        ch_doc = {}
-        for chapter, text in ch_text.items():
-            # log.debug(f"generating doc for {chapter}")
-            ch_doc[chapter] = _nlp(text)
-        return ch_doc
+    def metrics_key(self) -> str:
+        """Cache key of the persisted metrics, several of which count syllables."""
+        return digest(self.key(), "metrics", syllables_version())
+
+    @property
+    def token_table(self) -> TokenTable:
+        """Every token of the book as columns, built on first use."""
+        if self._token_table is None:
+            tables = self._make_chapter_tables(list(self.ch_text))
+            with span("concat tables"):
+                self._token_table = TokenTable.concat(
+                    [tables[chapter] for chapter in self.ch_text], list(self.ch_text)
+                )
+            self._table_keys = {ch: self.ch_doc.key(ch) for ch in self.ch_text}
+        return self._token_table
+
+    @token_table.setter
+    def token_table(self, table: TokenTable) -> None:
+        # for tables built elsewhere, such as in a Corpus worker
+        self._token_table = table
+        self._table_keys = None
+        self._freq_index = None
+        self._totals = None
+        self._prefix_counts = None
+        self.metrics.clear()
+
+    @property
+    def totals(self) -> Totals:
+        """
+        Book wide counts, the sum of every chapter's counts. Without a token
+        table the chapters are streamed, so the whole book is never held.
+        """
+        if self._totals is None:
+            syllables = load_syllables(self.cache.root if self.cache else None)
+            streamed = self._token_table is None
+            with span("totals") as fields:
+                self._chapter_totals = {
+                    chapter: Totals.of(table, syllables)
+                    for chapter, table in self.chapter_tables()
+                }
+                self._totals = sum(self._chapter_totals.values(), Totals())
+                fields["tokens"] = self._totals.tokens
+            if streamed:
+                # reload compares chapters against these keys, table or not
+                self._table_keys = {ch: self.ch_doc.key(ch) for ch in self.ch_text}
+        return self._totals
+
+    def reload(self) -> List[str]:
+        """
+        Rereads the text after it was edited and brings the book up to date.
+        Only chapters whose text changed are parsed again, the token table
+        keeps the columns of every other chapter and the totals are updated by
+        taking out the old counts of changed chapters and adding their new ones.
+        Returns the chapters that changed, removed ones included.
+        """
+        ch_text = ChapterText(self.text_path, self.limiter)
+        ch_doc = self.ch_doc.updated(ch_text)
+        if self._token_table is None and self._totals is None:
+            self.ch_text, self.ch_doc = ch_text, ch_doc
+            return list(ch_text)
+        old_keys = self._table_keys or {}
+        changed = [ch for ch in ch_text if old_keys.get(ch) != ch_doc.key(ch)]
+        removed = [ch for ch in old_keys if ch not in ch_text]
+        log.info(f"{len(changed)} changed and {len(removed)} removed chapters")
+        self.ch_text, self.ch_doc = ch_text, ch_doc
+        tables = self._make_chapter_tables(changed)
+        if self._token_table is not None:
+            old_table = self._token_table
+            for i, chapter in enumerate(old_table.chapters):
+                if chapter in ch_text and chapter not in tables:
+                    tables[chapter] = old_table.chapter_table(i)
+            self._token_table = TokenTable.concat(
+                [tables[chapter] for chapter in ch_text], list(ch_text)
+            )
+            # the index is a sort of the new table's columns, so derive it again
+            self._freq_index = None
+            self._prefix_counts = None
+        self._table_keys = {ch: ch_doc.key(ch) for ch in ch_text}
+        if self._totals is not None:
+            syllables = load_syllables(self.cache.root if self.cache else None)
+            totals = self._totals
+            for chapter in changed + removed:
+                if chapter in self._chapter_totals:
+                    totals = totals - self._chapter_totals.pop(chapter)
+            for chapter in changed:
+                self._chapter_totals[chapter] = Totals.of(tables[chapter], syllables)
+                totals = totals + self._chapter_totals[chapter]
+            self._totals = totals
+        self.metrics.clear()
+        return changed + removed
+
+    @property
+    def freq_index(self) -> FreqIndex:
+        """Positions of each (lowercase form, tag) pair, built on first use."""
+        if self._freq_index is None:
+            table = self.token_table
+            with span("freq index", tokens=len(table)):
+                if self.cache is None:
+                    self._freq_index = FreqIndex(table)
+                else:
+                    key = digest(self.key(), "freqindex")
+                    data = self.cache.get(key, "npy")
+                    if data is None:
+                        self._freq_index = FreqIndex(table)
+                        self.cache.put(key, "npy", self._freq_index.to_bytes())
+                    else:
+                        self._freq_index = FreqIndex.from_bytes(table, data)
+        return self._freq_index
+
+    def chapter_tables(
+        self, chapters: Optional[Iterable[str]] = None
+    ) -> Iterator[Tuple[str, TokenTable]]:
+        """
+        Yields (chapter, table) for the given chapters, or all of them, in order
+        without building the table of the whole book. Tables come from the
+        cache or are parsed a few nlp.pipe batches at a time, so memory stays
+        bounded by the batch rather than the book.
+        """
+        if chapters is None:
+            chapters = self.ch_text
+        chapters = list(chapters)
+        if self._token_table is not None:
+            t = self._token_table
+            positions = {chapter: i for i, chapter in enumerate(t.chapters)}
+            for chapter in chapters:
+                yield chapter, t.chapter_table(positions[chapter])
+            return
+        workers = pool_size(self.ch_doc.n_process)
+        size = self.ch_doc.batch_size * workers
+        for i in range(0, len(chapters), size):
+            chunk = chapters[i : i + size]
+            tables = self._make_chapter_tables(chunk)
+            for chapter in chunk:
+                yield chapter, tables[chapter]
+
+    def _make_chapter_tables(self, chapters: List[str]) -> Dict[str, TokenTable]:
+        """
+        Builds chapter tables from streamed docs, so the docs of the whole book
+        are never held at once. Chapter tables are cached next to the chapter
+        docs, so a warm build never deserializes a doc.
+        """
+        tables: Dict[str, TokenTable] = {}
+        keys: Dict[str, str] = {}
+        if self.cache is not None:
+            with span("load cached tables") as fields:
+                for chapter in chapters:
+                    keys[chapter] = digest(self.ch_doc.key(chapter), "tokentable")
+                    data = self.cache.get(keys[chapter], "npz")
+                    if data is not None:
+                        tables[chapter] = TokenTable.from_bytes(data)
+                fields["chapters"] = len(tables)
+        missing = [chapter for chapter in chapters if chapter not in tables]
+        for chapter, doc in self.ch_doc.stream(missing):
+            with span("build table", chapter=chapter, tokens=len(doc)):
+                tables[chapter] = TokenTable.from_doc(doc)
+                if self.cache is not None:
+                    self.cache.put(keys[chapter], "npz", tables[chapter].to_bytes())
+        return tables
 
     @staticmethod
     def cmu_syl(word: str) -> int:
@@ -72,7 +754,7 @@ class Moby:
         count the hard vowels that end in a digit.
         """
         return len(
-            [ph for ph in phoneme_dict[word][0] if ph.strip(string.ascii_letters)]
+            [ph for ph in load_phonemes()[word][0] if ph.strip(string.ascii_letters)]
         )
 
     @staticmethod
@@ -82,56 +764,31 @@ class Moby:
         """
         return len(re.findall(r"[aiouy]+e*|e(?!d$|ly).|[td]ed|le$", word))
 
-    @lru_cache(maxsize=None)
+    @metric
     def count_tokens(self) -> int:
         """Counts the number of words in a document."""
-        count = 0
-        for doc in self.ch_doc.values():
-            count += len(doc)
-        return count
+        return self.totals.tokens
 
-    @lru_cache(maxsize=None)
+    @metric
     def count_letters(self) -> int:
         """Counts the number of words in a document."""
-        letters: int = 0
-        for doc in self.ch_doc.values():
-            for t in doc:
-                if not t.is_punct and not t.is_space:
-                    letters += len(t)
-        return letters
-
-    @lru_cache(maxsize=None)
+        return self.totals.letters
+
+    @metric
     def count_words(self) -> int:
         """Counts the number of words in a document."""
-        words: int = 0
-        for doc in self.ch_doc.values():
-            for t in doc:
-                if not t.is_punct and not t.is_space:
-                    words += 1
-        return words
-
-    @lru_cache(maxsize=None)
+        return self.totals.words
+
+    @metric
     def count_sentences(self) -> int:
         """Counts the number of sentences in a document."""
-        sentences: int = 0
-        for doc in self.ch_doc.values():
-            for sent in doc.sents:
-                sentences += 1
-        return sentences
+        return self.totals.sentences
 
-    @lru_cache(maxsize=None)
+    @metric
     def count_syllables(self) -> int:
-        syllables: int = 0
-        for doc in self.ch_doc.values():
-            for t in doc:
-                if not t.is_punct and not t.is_space:
-                    word = t.norm_
-                    if phoneme_dict.get(word):
-                        syllables += self.cmu_syl(word)
-                    else:
-                        syllables += self.naive_syl(word)
-        return syllables
+        return self.totals.syllables
 
+    @metric
     def automated_readablitity_index(self) -> float:
         """
         The Automated Readability Index is derived from ratios representing word
@@ -155,6 +812,7 @@ class Moby:
         s = self.count_sentences()
         return 4.71 * (l / w) + 0.5 * (w / s) - 21.43
 
+    @metric
     def flesch_kincaid_reading_age(self) -> float:
         """
         Flesch Kincaid reading age is based on the Flesch Reading Ease formula
@@ -169,6 +827,7 @@ class Moby:
         asw = self.count_syllables() / self.count_words()
         return (0.39 * asl) + (11.8 * asw) - 15.59
 
+    @metric
     def flesch_reading_ease(self) -> float:
         """
         The Flesch Reading Ease Formula is a simple approach to assess the
@@ -188,6 +847,61 @@ class Moby:
         asw = self.count_syllables() / self.count_words()
         return 206.835 - (1.015 * asl) - (84.6 * asw)
 
+    @property
+    def prefix_counts(self) -> PrefixCounts:
+        """Running counts over the token table, built on first use."""
+        if self._prefix_counts is None:
+            t = self.token_table
+            syllables = load_syllables(self.cache.root if self.cache else None)
+            with span("prefix counts", tokens=len(t)):
+                self._prefix_counts = PrefixCounts.of(t, syllables)
+        return self._prefix_counts
+
+    def readability(
+        self, window: Optional[int] = None, step: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Readability scores and counts per chapter, or with window per window of
+        that many tokens every step tokens, see readability.windows. Window rows
+        carry their token range and the norm_index of their middle.
+        """
+        t = self.token_table
+        if window is None:
+            numbers = t.chapter_numbers()
+            labels = [
+                {"title": self.title, "chapter": int(n), "start": int(s), "end": int(e)}
+                for n, s, e in zip(numbers, t.offsets[:-1], t.offsets[1:])
+            ]
+            return profile(self.prefix_counts, t.offsets[:-1], t.offsets[1:], labels)
+        starts, ends = windows(len(t), window, step)
+        labels = [
+            {
+                "title": self.title,
+                "start": int(s),
+                "end": int(e),
+                "norm_index": int(s + e) / 2 / max(len(t), 1),
+            }
+            for s, e in zip(starts, ends)
+        ]
+        return profile(self.prefix_counts, starts, ends, labels)
+
+    def chapter_vectors(self) -> numpy.ndarray:
+        """
+        Doc.vector of every chapter as rows of a matrix, in chapter order. With
+        a cache the matrix is kept in the vector store, under the title with
+        chapters as keys, and later calls do not touch the docs.
+        """
+        if self.vector_store is None:
+            return numpy.array([doc.vector for _, doc in self.ch_doc.stream()])
+        name, source = f"{self.title}.chapters", digest(self.key(), "chaptervectors")
+        vectors = self.vector_store.get(name, source)
+        if vectors is None:
+            matrix = numpy.array([doc.vector for _, doc in self.ch_doc.stream()])
+            vectors = Vectors(list(self.ch_text), matrix)
+            self.vector_store.put(name, vectors, source)
+        return vectors.rows(self.ch_text)
+
+    @timed("sent_data")
     def sent_data(self) -> List[Dict]:
         pos_whitelist: Set[str] = set(["ADJ", "NOUN", "PROPN"])
         data: List[Dict] = []
@@ -213,40 +927,65 @@ class Moby:
         return data
 
     def propn(self) -> Counter:
-        propn_freq: Counter = Counter()
-        for doc in self.ch_doc.values():
-            for t in doc:
-                if t.tag_ == "NNP":
-                    propn_freq[t.lemma_] += 1
-        return propn_freq
+        return Counter(self.totals.propn)
 
     def verb(self) -> Counter:
-        verb_freq: Counter = Counter()
-        for doc in self.ch_doc.values():
-            for t in doc:
-                if t.pos_ == "VERB":
-                    verb_freq[t.lemma_] += 1
-        return verb_freq
+        return Counter(self.totals.verb)
 
     def freq(self, words: Set[str], tag: str) -> List[Dict[str, Any]]:
-        result = []
-        index_total = self.count_tokens()
-        index_offset = 0
-        for ch, doc in self.ch_doc.items():
-            chi = int(ch.split("_")[1])
-            for t in doc:
-                if t.lower_ in words and t.tag_ == tag:
-                    result.append(
-                        {
-                            "title": self.title,
-                            "word": t.lower_,
-                            "chapter": chi,
-                            "index": index_offset + t.i,
-                            "norm_index": (index_offset + t.i) / index_total,
-                        }
-                    )
-            index_offset += len(doc)
-        return result
+        """Every occurrence of the words with the tag, in reading order."""
+        t = self.token_table
+        hits = self.freq_index.positions(words, tag)
+        chapter_numbers = t.chapter_numbers()
+        index_total = len(t)
+        return [
+            {
+                "title": self.title,
+                "word": t.strings[int(t.lower[i])],
+                "chapter": int(chapter_numbers[t.chapter[i]]),
+                "index": int(i),
+                "norm_index": int(i) / index_total,
+            }
+            for i in hits
+        ]
+
+    def freq_bins(
+        self,
+        words: Set[str],
+        tag: str,
+        by: str = "norm_index",
+        bins: Optional[int] = None,
+        per_word: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        Occurrences of the words with the tag counted into bins of norm_index
+        or chapter, per word or all words together. bins defaults to 10 over
+        norm_index and to one bin per chapter, see histogram.bin_rows.
+        """
+        t = self.token_table
+        hits = self.freq_index.positions(words, tag)
+        if by == "norm_index":
+            values = hits / max(len(t), 1)
+            edges = bin_edges(0, 1, bins or 10)
+        elif by == "chapter":
+            numbers = t.chapter_numbers()
+            values = numbers[t.chapter[hits]]
+            first, last = (int(numbers.min()), int(numbers.max())) if len(t) else (1, 1)
+            edges = bin_edges(first, last + 1, bins or last - first + 1)
+        else:
+            raise ValueError(f"cannot bin by {by}")
+        if per_word:
+            found, groups = numpy.unique(t.lower[hits], return_inverse=True)
+            labels = [{"title": self.title, "word": t.strings[int(h)]} for h in found]
+        else:
+            groups = numpy.zeros(len(hits), dtype="int64")
+            labels = [{"title": self.title}]
+        counts = bin_counts(values, groups.reshape(-1), len(labels), edges)
+        return bin_rows(labels, edges, counts)
+
+    def freq_counts(self, words: Set[str], tag: str) -> Dict[str, int]:
+        """Number of occurrences of each of the words with the tag."""
+        return self.freq_index.counts(words, tag)
 
     def statistics(self) -> Dict[str, Any]:
         return {
@@ -0,0 +1,331 @@
+"""
+N-gram and collocation counts of books.
+
+An n-gram is a run of n words inside a sentence, of lemmas or lowercase forms,
+broken by punctuation and by words that a part of speech or stop word filter
+leaves out. Every n-gram is identified by a 64 bit id mixed from the string
+hashes of its words, so counting is sorting and summing integer arrays rather
+than filling dicts of tuples. Books are counted a few chapters at a time and
+the counts merged, so memory follows the number of distinct n-grams rather
+than the length of the book.
+"""
+import io
+import logging
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Set
+
+import numpy  # type: ignore
+
+from cache import digest
+from tokentable import TokenTable
+
+if TYPE_CHECKING:
+    from moby import Moby
+
+# bump when n-grams are counted differently so cached counts are redone
+VERSION = "1"
+# FNV-1a over 64 bit words, the string hashes of an n-gram's words
+OFFSET = numpy.uint64(0xCBF29CE484222325)
+PRIME = numpy.uint64(0x100000001B3)
+# chapters counted before their counts are merged into the book's
+MERGE_EVERY = 16
+
+log = logging.getLogger("ngrams")
+
+
+def mix(parts: numpy.ndarray) -> numpy.ndarray:
+    """The id of every row of word hashes, an (m, n) uint64 matrix."""
+    ids = numpy.full(len(parts), OFFSET, dtype="uint64")
+    for j in range(parts.shape[1]):
+        # uint64 arithmetic wraps around, which is what the hash wants
+        ids = (ids ^ parts[:, j]) * PRIME
+    return ids
+
+
+def runs(t: TokenTable, column: str, mask: numpy.ndarray, n: int) -> numpy.ndarray:
+    """
+    Word hashes of every run of n masked tokens of a table that lies inside
+    one sentence, as an (m, n) matrix in reading order.
+    """
+    m = len(t) - n + 1
+    if m <= 0:
+        return numpy.zeros((0, n), dtype="uint64")
+    keep = numpy.ones(m, dtype="bool")
+    for j in range(n):
+        keep &= mask[j : j + m]
+    # sentence numbers only grow, so equal ends mean one sentence
+    keep &= t.sentence[n - 1 :] == t.sentence[:m]
+    starts = numpy.nonzero(keep)[0]
+    values = t.columns[column]
+    return numpy.stack([values[starts + j] for j in range(n)], axis=1)
+
+
+class NGramTable:
+    """
+    Counts of the distinct n-grams of one length, as rows sorted by id: the
+    id, the word hashes and the count. strings resolves the word hashes.
+    """
+
+    def __init__(
+        self,
+        n: int,
+        ids: numpy.ndarray,
+        parts: numpy.ndarray,
+        counts: numpy.ndarray,
+        strings: Dict[int, str],
+    ):
+        self.n = n
+        self.ids = ids
+        self.parts = parts
+        self.counts = counts
+        self.strings = strings
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def total(self) -> int:
+        """Number of n-gram occurrences, distinct or not."""
+        return int(self.counts.sum())
+
+    @classmethod
+    def count(
+        cls,
+        n: int,
+        parts: numpy.ndarray,
+        strings: Dict[int, str],
+        counts: Optional[numpy.ndarray] = None,
+    ) -> "NGramTable":
+        """
+        Counts rows of word hashes, each weighed by counts when given, e.g.
+        the rows and counts of several tables being merged.
+        """
+        ids = mix(parts)
+        unique, first, inverse = numpy.unique(
+            ids, return_index=True, return_inverse=True
+        )
+        summed = numpy.bincount(inverse.reshape(-1), counts, minlength=len(unique))
+        used = numpy.unique(parts)
+        return cls(
+            n,
+            unique,
+            parts[first],
+            summed.astype("int64"),
+            {int(h): strings[int(h)] for h in used},
+        )
+
+    @classmethod
+    def merge(cls, n: int, tables: List["NGramTable"]) -> "NGramTable":
+        strings: Dict[int, str] = {}
+        for table in tables:
+            strings.update(table.strings)
+        parts = numpy.concatenate(
+            [t.parts for t in tables] or [numpy.zeros((0, n), "uint64")]
+        )
+        counts = numpy.concatenate([t.counts for t in tables] or [numpy.zeros(0)])
+        return cls.count(n, parts, strings, counts)
+
+    def lookup(self, ids: numpy.ndarray) -> numpy.ndarray:
+        """Counts of the n-grams with ids, 0 for ones that never occur."""
+        found = numpy.zeros(len(ids), dtype="int64")
+        if not len(self):
+            return found
+        rows = numpy.minimum(numpy.searchsorted(self.ids, ids), len(self) - 1)
+        hit = self.ids[rows] == ids
+        found[hit] = self.counts[rows[hit]]
+        return found
+
+    def texts(self, rows: Optional[Iterable[int]] = None) -> List[str]:
+        """The words of the n-grams of rows, or of every n-gram, joined by spaces."""
+        if rows is None:
+            rows = range(len(self))
+        return [" ".join(self.strings[int(h)] for h in self.parts[i]) for i in rows]
+
+    def pruned(self, min_count: int) -> "NGramTable":
+        keep = self.counts >= min_count
+        return NGramTable(
+            self.n, self.ids[keep], self.parts[keep], self.counts[keep], self.strings
+        )
+
+
+class NGrams:
+    """
+    The n-gram tables of a book for every length up to n, counted from
+    column, "lemma", "lower" or "norm", of the words left by the pos and stop
+    filters.
+    """
+
+    def __init__(self, tables: Dict[int, NGramTable]):
+        self.tables = tables
+
+    def __getitem__(self, n: int) -> NGramTable:
+        return self.tables[n]
+
+    @property
+    def n(self) -> int:
+        return max(self.tables)
+
+    @staticmethod
+    def mask(t: TokenTable, pos: Optional[Set[str]], stop: bool) -> numpy.ndarray:
+        """Tokens that may be part of an n-gram."""
+        mask = t.words
+        if not stop:
+            mask = mask & ~t.is_stop
+        if pos is not None:
+            mask = mask & numpy.isin(t.pos, t.hashes(pos))
+        return mask
+
+    @classmethod
+    def count(
+        cls,
+        tables: Iterable[TokenTable],
+        n: int = 2,
+        column: str = "lemma",
+        pos: Optional[Set[str]] = None,
+        stop: bool = True,
+    ) -> "NGrams":
+        """Counts the n-grams of chapter tables, a batch of chapters at a time."""
+        if column not in ("lemma", "lower", "norm"):
+            raise ValueError(f"n-grams of {column} are not counted")
+        merged: Dict[int, List[NGramTable]] = {k: [] for k in range(1, n + 1)}
+        pending = 0
+        for t in tables:
+            mask = cls.mask(t, pos, stop)
+            for k in merged:
+                merged[k].append(
+                    NGramTable.count(k, runs(t, column, mask, k), t.strings)
+                )
+            pending += 1
+            if pending == MERGE_EVERY:
+                merged = {k: [NGramTable.merge(k, ts)] for k, ts in merged.items()}
+                pending = 0
+        return cls({k: NGramTable.merge(k, ts) for k, ts in merged.items()})
+
+    @classmethod
+    def of_book(
+        cls,
+        book: "Moby",
+        n: int = 2,
+        column: str = "lemma",
+        pos: Optional[Set[str]] = None,
+        stop: bool = True,
+    ) -> "NGrams":
+        """
+        The n-grams of a book from its cache, or counted from its chapter
+        tables, which are streamed, and cached.
+        """
+        key = digest(
+            book.key(),
+            "ngrams",
+            VERSION,
+            column,
+            str(n),
+            ",".join(sorted(pos)) if pos is not None else "",
+            str(stop),
+        )
+        if book.cache is not None:
+            data = book.cache.get(key, "npz")
+            if data is not None:
+                return cls.from_bytes(data)
+        tables = (t for _, t in book.chapter_tables())
+        grams = cls.count(tables, n, column, pos, stop)
+        log.info(
+            f"{book.title}: "
+            + ", ".join(f"{len(grams[k])} {k}-grams" for k in range(1, n + 1))
+        )
+        if book.cache is not None:
+            book.cache.put(key, "npz", grams.to_bytes())
+        return grams
+
+    def to_bytes(self) -> bytes:
+        strings: Dict[int, str] = {}
+        arrays: Dict[str, numpy.ndarray] = {}
+        for k, table in self.tables.items():
+            strings.update(table.strings)
+            arrays[f"parts_{k}"] = table.parts
+            arrays[f"counts_{k}"] = table.counts
+        arrays["string_keys"] = numpy.array(list(strings.keys()), dtype="uint64")
+        arrays["string_values"] = numpy.array(list(strings.values()), dtype="U")
+        buf = io.BytesIO()
+        numpy.savez(buf, **arrays)  # type: ignore
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "NGrams":
+        with numpy.load(io.BytesIO(data)) as npz:
+            strings = {
+                int(h): str(s) for h, s in zip(npz["string_keys"], npz["string_values"])
+            }
+            tables = {}
+            for name in npz.files:
+                if name.startswith("parts_"):
+                    k = int(name.split("_")[1])
+                    parts = npz[name]
+                    # rows were saved in id order, so the ids come out sorted
+                    tables[k] = NGramTable(
+                        k, mix(parts), parts, npz[f"counts_{k}"], strings
+                    )
+            return cls(tables)
+
+
+def collocations(grams: NGrams, n: int = 2, min_count: int = 1) -> List[Dict[str, Any]]:
+    """
+    Scores of every n-gram occurring at least min_count times, as the pair of
+    its first n - 1 words and its last word: pointwise mutual information in
+    bits and Dunning's log-likelihood ratio. Rows come out best ratio first.
+    """
+    if n < 2:
+        raise ValueError("collocations need n-grams of two or more words")
+    table = grams[n].pruned(min_count)
+    total = grams[n].total
+    xy = table.counts.astype("float64")
+    x = grams[n - 1].lookup(mix(table.parts[:, :-1])).astype("float64")
+    y = grams[1].lookup(mix(table.parts[:, -1:])).astype("float64")
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        pmi = numpy.log2(xy * total / (x * y))
+        observed = [xy, x - xy, y - xy, total - x - y + xy]
+        expected = [x * y, x * (total - y), (total - x) * y, (total - x) * (total - y)]
+        cells = [
+            numpy.where(o > 0, o * numpy.log(o * total / e), 0.0)
+            for o, e in zip(observed, expected)
+        ]
+        llr = 2 * numpy.sum(cells, axis=0)
+    order = numpy.argsort(-llr, kind="stable")
+    texts = table.texts(order)
+    return [
+        {
+            "ngram": text,
+            "count": int(table.counts[i]),
+            "pmi": float(pmi[i]),
+            "llr": float(llr[i]),
+        }
+        for text, i in zip(texts, order)
+    ]
+
+
+def diff(
+    original: NGrams, abridged: NGrams, n: int = 2, min_count: int = 1
+) -> List[Dict[str, Any]]:
+    """
+    Every n-gram occurring at least min_count times in the original with its
+    count and rate per million n-grams in each book, and the log2 ratio of the
+    rates, add one smoothed. Rows come out most cut first.
+    """
+    o = original[n].pruned(min_count)
+    a_counts = abridged[n].lookup(o.ids)
+    o_total, a_total = max(original[n].total, 1), max(abridged[n].total, 1)
+    o_rate = o.counts * 1e6 / o_total
+    a_rate = a_counts * 1e6 / a_total
+    ratio = numpy.log2((o.counts + 1) / o_total) - numpy.log2((a_counts + 1) / a_total)
+    order = numpy.lexsort((-o.counts, -ratio))
+    texts = o.texts(order)
+    return [
+        {
+            "ngram": text,
+            "original": int(o.counts[i]),
+            "abridged": int(a_counts[i]),
+            "original per million": float(o_rate[i]),
+            "abridged per million": float(a_rate[i]),
+            "log2 ratio": float(ratio[i]),
+        }
+        for text, i in zip(texts, order)
+    ]
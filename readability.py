@@ -0,0 +1,141 @@
+"""
+Readability of stretches of a book rather than of the whole book.
+
+Running totals of letters, words and syllables over the tokens of a book, with
+the sentence number of every token, give the counts of any range of tokens
+from its two ends. After one pass over the token table every chapter and every
+window, whatever its size, costs a few array lookups.
+"""
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+import numpy  # type: ignore
+
+from tokentable import TokenTable
+
+if TYPE_CHECKING:
+    from moby import Syllables
+
+# Average reading speeds of people.
+CHILD_WPM = 180
+ADULT_WPM = 265
+# the scores of a profile row, each charted on its own
+SCORES = [
+    "flesch_reading_ease",
+    "flesch_kincaid_reading_age",
+    "automated_readability_index",
+]
+
+
+class PrefixCounts:
+    """
+    Counts of the tokens before each token of a book, so the counts of the
+    tokens start to end are the entries at end less the entries at start.
+    """
+
+    def __init__(
+        self,
+        letters: numpy.ndarray,
+        words: numpy.ndarray,
+        syllables: numpy.ndarray,
+        sentence: numpy.ndarray,
+    ):
+        self.letters = _running(letters)
+        self.words = _running(words)
+        self.syllables = _running(syllables)
+        # sentence numbers already run, so a range holds last - first + 1
+        self.sentence = numpy.asarray(sentence, dtype="int64")
+
+    def __len__(self) -> int:
+        return len(self.sentence)
+
+    @classmethod
+    def of(cls, t: TokenTable, syllables: "Syllables") -> "PrefixCounts":
+        """
+        Counts of a token table, letters and syllables of words only, the way
+        moby.Totals counts them. Each distinct word is looked up once.
+        """
+        words = t.words
+        types, inverse = numpy.unique(t.norm[words], return_inverse=True)
+        per_type = syllables.count(t.strings[int(h)] for h in types)
+        per_token = numpy.zeros(len(t), dtype="int64")
+        per_token[words] = per_type[inverse.reshape(-1)]
+        return cls(numpy.where(words, t.length, 0), words, per_token, t.sentence)
+
+    def counts(
+        self, starts: numpy.ndarray, ends: numpy.ndarray
+    ) -> Dict[str, numpy.ndarray]:
+        """Letters, words, sentences and syllables of every range start to end."""
+        starts = numpy.asarray(starts, dtype="int64")
+        ends = numpy.asarray(ends, dtype="int64")
+        sentences = numpy.zeros(len(starts), dtype="int64")
+        full = ends > starts
+        sentences[full] = (
+            self.sentence[ends[full] - 1] - self.sentence[starts[full]] + 1
+        )
+        return {
+            "letters": self.letters[ends] - self.letters[starts],
+            "words": self.words[ends] - self.words[starts],
+            "sentences": sentences,
+            "syllables": self.syllables[ends] - self.syllables[starts],
+        }
+
+
+def _running(values: numpy.ndarray) -> numpy.ndarray:
+    return numpy.concatenate([[0], numpy.cumsum(values, dtype="int64")])
+
+
+def scores(counts: Dict[str, numpy.ndarray]) -> Dict[str, numpy.ndarray]:
+    """
+    The formulas of Moby.flesch_reading_ease, flesch_kincaid_reading_age and
+    automated_readablitity_index over arrays of counts, nan where a range has
+    no words or sentences, and reading times in minutes.
+    """
+    words = counts["words"].astype("float64")
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        asl = words / counts["sentences"]
+        asw = counts["syllables"] / words
+        lpw = counts["letters"] / words
+    return {
+        "flesch_reading_ease": 206.835 - (1.015 * asl) - (84.6 * asw),
+        "flesch_kincaid_reading_age": (0.39 * asl) + (11.8 * asw) - 15.59,
+        "automated_readability_index": 4.71 * lpw + 0.5 * asl - 21.43,
+        "reading_minutes_adult": words / ADULT_WPM,
+        "reading_minutes_child": words / CHILD_WPM,
+    }
+
+
+def windows(n: int, size: int, step: Optional[int] = None) -> numpy.ndarray:
+    """
+    Starts and ends of windows of size tokens every step tokens, half a window
+    by default, as two rows. The last window ends with the book, so the tail
+    is covered, and a book shorter than a window is one window.
+    """
+    if size < 1:
+        raise ValueError(f"windows of {size} tokens")
+    step = step or max(size // 2, 1)
+    starts = numpy.arange(0, max(n - size, 0) + 1, step, dtype="int64")
+    if starts[-1] + size < n:
+        starts = numpy.append(starts, n - size)
+    return numpy.stack([starts, numpy.minimum(starts + size, n)])
+
+
+def profile(
+    prefix: PrefixCounts,
+    starts: numpy.ndarray,
+    ends: numpy.ndarray,
+    labels: List[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """
+    A row per range of its labels, counts and scores, with None for scores
+    that are undefined so rows serialize as json.
+    """
+    counts = prefix.counts(starts, ends)
+    values = dict(counts, **scores(counts))
+    rows = []
+    for i, label in enumerate(labels):
+        row = dict(label)
+        for name, column in values.items():
+            value = column[i].item()
+            row[name] = None if value != value else value
+        rows.append(row)
+    return rows
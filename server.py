@@ -0,0 +1,282 @@
+"""
+Local query server that keeps books warm between questions.
+
+Every command of main.py loads the model and the books before answering one
+question. The server does that once: books are parsed in a pool of worker
+processes, which hand back token tables and chapter vectors, and are then kept
+in memory, so a query is a few array reductions. Queries are plain HTTP,
+GET /freq?titles=original&words=ahab,stubb or a POST of the same parameters as
+a json object, and answers are json.
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy  # type: ignore
+
+from corpus import top_by
+from moby import Moby
+from similarity import cosine_matrix
+from similarity import top_k as nearest
+from tokentable import TokenTable
+from workers import pool_size
+
+log = logging.getLogger("server")
+
+# every query reads a table with lemmas, tags and sentences
+ANNOTATIONS = {"lemmas", "sents"}
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Server Error"}
+
+
+def _warm(
+    args: Tuple[str, str, Optional[int], Optional[str]]
+) -> Tuple[TokenTable, numpy.ndarray]:
+    """Worker side of Server.book, parses a book and returns what queries read."""
+    title, text_path, limiter, cache_dir = args
+    book = Moby(title, text_path, limiter, cache_dir, annotations=ANNOTATIONS)
+    return book.token_table, book.chapter_vectors()
+
+
+def _words(words: Any) -> List[str]:
+    """Words from a json list or a comma separated query string."""
+    if isinstance(words, str):
+        words = words.split(",")
+    return [str(word).strip().lower() for word in words if str(word).strip()]
+
+
+def _plain(value: Any) -> Any:
+    """json.dumps default for the numpy values answers carry."""
+    if isinstance(value, numpy.ndarray):
+        return value.tolist()
+    if isinstance(value, numpy.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not json serializable")
+
+
+class Server:
+    """
+    Books of a manifest, title to text path, loaded on their first query and
+    kept. Parsing runs in up to processes worker processes, see
+    workers.pool_size, and queries run in threads so the event loop keeps
+    accepting connections while one is answered.
+    """
+
+    def __init__(
+        self,
+        manifest: Dict[str, str],
+        limiter: Optional[int] = None,
+        cache_dir: Optional[str] = None,
+        processes: Optional[int] = None,
+    ):
+        self.manifest = manifest
+        self.limiter = limiter
+        self.cache_dir = cache_dir
+        self.pool = ProcessPoolExecutor(max_workers=pool_size(processes))
+        # the first job forks every worker, which has to happen before any
+        # connection is open, a forked worker would hold on to the sockets
+        # of open connections and their clients would never see the answer end
+        self.pool.submit(os.getpid).result()
+        self.books: Dict[str, Moby] = {}
+        self.vectors: Dict[str, numpy.ndarray] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+        self.queries: Dict[str, Callable[..., Any]] = {
+            "books": self.list_books,
+            "table": self.table,
+            "propn": self.propn,
+            "verb": self.verb,
+            "freq": self.freq,
+            "sim": self.sim,
+        }
+
+    async def book(self, title: str) -> Moby:
+        """The book with title, parsed by a worker the first time it is asked for."""
+        if title not in self.manifest:
+            raise LookupError(f"unknown book {title}")
+        if title not in self._loading:
+            self._loading[title] = asyncio.ensure_future(self._load(title))
+        await self._loading[title]
+        return self.books[title]
+
+    async def _load(self, title: str) -> None:
+        loop = asyncio.get_event_loop()
+        job = (title, self.manifest[title], self.limiter, self.cache_dir)
+        log.info(f"loading {title}")
+        try:
+            table, vectors = await loop.run_in_executor(self.pool, _warm, job)
+        except BaseException:
+            # let the next query try again
+            del self._loading[title]
+            raise
+        # totals and the index are built off the event loop
+        self.books[title] = await loop.run_in_executor(None, self._keep, title, table)
+        self.vectors[title] = vectors
+        log.info(f"loaded {title}, {len(table)} tokens")
+
+    def _keep(self, title: str, table: TokenTable) -> Moby:
+        book = Moby(
+            title,
+            self.manifest[title],
+            self.limiter,
+            self.cache_dir,
+            annotations=ANNOTATIONS,
+        )
+        book.token_table = table
+        # built here once, rather than by the first queries side by side
+        book.totals, book.freq_index
+        return book
+
+    async def warm(self, titles: Optional[List[str]] = None) -> None:
+        """Loads the books with titles, or every book, side by side."""
+        await asyncio.gather(*[self.book(t) for t in titles or self.manifest])
+
+    async def query(self, name: str, params: Dict[str, Any]) -> Any:
+        """Answers the query name with params, see queries for the names."""
+        if name not in self.queries:
+            raise LookupError(f"unknown query {name}")
+        titles = _words(params.pop("titles", None) or list(self.manifest))
+        loaded = await asyncio.gather(*[self.book(t) for t in titles])
+        books = dict(zip(titles, loaded))
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            None, lambda: self.queries[name](books, **params)
+        )
+
+    def list_books(self, books: Dict[str, Moby]) -> Dict[str, Any]:
+        return {title: list(book.ch_text) for title, book in books.items()}
+
+    def table(self, books: Dict[str, Moby]) -> Dict[str, Any]:
+        return {
+            title: dict(book.statistics(), **book.indexes())
+            for title, book in books.items()
+        }
+
+    def _combined(
+        self, books: Dict[str, Moby], counts: Dict[str, Counter], n: Any
+    ) -> List[Tuple[str, Dict[str, int]]]:
+        combined: Dict[str, Dict[str, int]] = {}
+        for title, book_counts in counts.items():
+            for word, count in book_counts.items():
+                combined.setdefault(word, {t: 0 for t in books})[title] += count
+        return top_by(combined, next(iter(books)))[: int(n)]
+
+    def propn(
+        self, books: Dict[str, Moby], n: Any = 25
+    ) -> List[Tuple[str, Dict[str, int]]]:
+        """Top proper nouns of the first book with their counts in every book."""
+        counts = {title: book.propn() for title, book in books.items()}
+        return self._combined(books, counts, n)
+
+    def verb(
+        self, books: Dict[str, Moby], n: Any = 25
+    ) -> List[Tuple[str, Dict[str, int]]]:
+        """Top verbs of the first book with their counts in every book."""
+        counts = {title: book.verb() for title, book in books.items()}
+        return self._combined(books, counts, n)
+
+    def freq(
+        self,
+        books: Dict[str, Moby],
+        words: Any = "",
+        tag: str = "NNP",
+        bins: Any = None,
+        by: str = "norm_index",
+    ) -> Dict[str, Any]:
+        """
+        Counts of the words with the tag in every book and, with bins, the
+        occurrences binned as Moby.freq_bins does.
+        """
+        search = set(_words(words))
+        if not search:
+            raise ValueError("freq needs words")
+        result: Dict[str, Any] = {
+            "counts": {t: b.freq_counts(search, tag) for t, b in books.items()}
+        }
+        if bins is not None:
+            result["bins"] = [
+                row
+                for book in books.values()
+                for row in book.freq_bins(search, tag, by, int(bins) or None)
+            ]
+        return result
+
+    def sim(self, books: Dict[str, Moby], top_k: Any = 3) -> Dict[str, Any]:
+        """
+        The top_k closest chapters of the second book for every chapter of
+        the first, by cosine similarity of chapter vectors.
+        """
+        if len(books) != 2:
+            raise ValueError("sim compares two titles")
+        (a_title, a), (b_title, b) = books.items()
+        matrix = cosine_matrix(self.vectors[a_title], self.vectors[b_title])
+        indices, scores = nearest(matrix, int(top_k))
+        b_chapters = list(b.ch_text)
+        return {
+            chapter: [[b_chapters[j], float(s)] for j, s in zip(row, row_scores)]
+            for chapter, row, row_scores in zip(a.ch_text, indices, scores)
+        }
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Answers one HTTP request on a connection and closes it."""
+        try:
+            status, body = await self._respond(reader)
+            data = json.dumps(body, default=_plain).encode("utf-8")
+        except Exception as e:
+            log.exception("query failed")
+            status, data = 500, json.dumps({"error": str(e)}).encode("utf-8")
+        writer.write(
+            (
+                f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                "Content-Type: application/json\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode("latin-1")
+            + data
+        )
+        await writer.drain()
+        writer.close()
+
+    async def _respond(self, reader: asyncio.StreamReader) -> Tuple[int, Any]:
+        request = (await reader.readline()).decode("latin-1").split()
+        if len(request) < 2:
+            return 400, {"error": "not an http request"}
+        headers: Dict[str, str] = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        url = urlsplit(request[1])
+        params: Dict[str, Any] = dict(parse_qsl(url.query))
+        length = int(headers.get("content-length", 0))
+        if length:
+            try:
+                params.update(json.loads(await reader.readexactly(length)))
+            except ValueError as e:
+                return 400, {"error": f"body is not json: {e}"}
+        name = url.path.strip("/")
+        try:
+            return 200, await self.query(name, params)
+        except LookupError as e:
+            return 404, {"error": str(e)}
+        except (TypeError, ValueError) as e:
+            return 400, {"error": str(e)}
+
+    async def serve(self, host: str, port: int, warm: bool = True) -> None:
+        """Serves until cancelled, loading every book meanwhile when warm."""
+        server = await asyncio.start_server(self.handle, host, port)
+        log.info(f"serving {', '.join(self.manifest)} on {host}:{port}")
+        if warm:
+            asyncio.ensure_future(self.warm())
+        async with server:
+            await server.serve_forever()
+
+    def close(self) -> None:
+        self.pool.shutdown()
@@ -0,0 +1,51 @@
+"""
+Cosine similarity between every pair of rows of two vector matrices.
+
+Rows are normalized once and compared with a single matrix multiply, which
+gives the same numbers as calling Doc.similarity on every pair of docs.
+"""
+import csv
+from typing import List, Tuple
+
+import numpy  # type: ignore
+
+
+def unit_rows(matrix: numpy.ndarray) -> numpy.ndarray:
+    """Scales rows to unit length, rows of zeros (no vectors) stay zero."""
+    matrix = numpy.asarray(matrix, dtype="float32")
+    norms = numpy.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / numpy.where(norms == 0, 1, norms)
+
+
+def cosine_matrix(a: numpy.ndarray, b: numpy.ndarray) -> numpy.ndarray:
+    """Cosine similarity of every row of a (rows) against every row of b (cols)."""
+    return unit_rows(a) @ unit_rows(b).T
+
+
+def top_k(matrix: numpy.ndarray, k: int) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Column indices and scores of the k highest scores in each row, best first.
+    """
+    k = min(k, matrix.shape[1])
+    if k <= 0:
+        empty = numpy.zeros((matrix.shape[0], 0))
+        return empty.astype("int64"), empty
+    # argpartition finds the top k without sorting whole rows
+    part = numpy.argpartition(-matrix, k - 1, axis=1)[:, :k]
+    scores = numpy.take_along_axis(matrix, part, axis=1)
+    order = numpy.argsort(-scores, axis=1)
+    return (
+        numpy.take_along_axis(part, order, axis=1),
+        numpy.take_along_axis(scores, order, axis=1),
+    )
+
+
+def write_matrix(
+    path: str, rows: List[str], cols: List[str], matrix: numpy.ndarray
+) -> None:
+    """Writes the matrix as tsv with the column keys as header row."""
+    with open(path, "w") as fh:
+        writer = csv.writer(fh, delimiter="\t")
+        writer.writerow([""] + cols)
+        for key, row in zip(rows, matrix):
+            writer.writerow([key] + [f"{v:0.6f}" for v in row])
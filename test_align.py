@@ -0,0 +1,62 @@
+import numpy
+
+from align import SentenceMatrix, align, candidate_chapters, coverage
+from moby import Moby
+from test_moby import no_model
+
+TEST_PATH = "/script/data/test.txt"
+
+
+def _matrix(chapter, vectors, words=None):
+    chapter = numpy.array(chapter)
+    vectors = numpy.array(vectors, dtype="float32")
+    words = numpy.ones(len(chapter), "int64") if words is None else numpy.array(words)
+    chapters = [f"chapter_{i + 1}" for i in range(chapter.max() + 1)]
+    return SentenceMatrix(chapters, chapter, vectors, words, [""] * len(chapter))
+
+
+def test_of_book():
+    book = Moby("test", TEST_PATH, annotations={"sents"})
+    m = SentenceMatrix.of_book(book)
+    sents = [s for doc in book.ch_doc.values() for s in doc.sents]
+    assert len(m) == len(sents)
+    first = [t for t in sents[0] if not t.is_punct and not t.is_space]
+    assert m.words[0] == len(first)
+    assert numpy.allclose(m.vectors[0], numpy.mean([t.vector for t in first], axis=0))
+
+
+def test_align():
+    o = _matrix(
+        [0, 0, 1, 1, 2, 2],
+        [[1, 0, 0], [0, 1, 0], [0, 0, 1], [1, 1, 0], [0, 1, 1], [1, 0, 1]],
+    )
+    a = _matrix([0, 1], [[0, 0.9, 1.1], [0.1, 1, 0]])
+    assert [c.tolist() for c in candidate_chapters(a, o, 1, 0)] == [[2], [0]]
+    indices, scores = align(a, o, k=2, chapters=1, window=0)
+    assert indices.tolist() == [[4, 5], [1, 0]]
+    assert scores[0, 0] > 0.99 and scores[0, 0] >= scores[0, 1]
+    # a wider window reaches into the neighbouring chapters
+    indices, _ = align(a, o, k=6, chapters=1, window=1)
+    assert sorted(indices[0][indices[0] >= 0].tolist()) == [2, 3, 4, 5]
+
+
+def test_coverage():
+    o = _matrix([0, 0, 1], [[1, 0], [0, 1], [1, 1]], words=[3, 1, 2])
+    best = numpy.array([0, 0, 2])
+    scores = numpy.array([0.95, 0.99, 0.5])
+    rows = coverage(o, best, scores, threshold=0.9)
+    assert [r["kept sentences"] for r in rows] == [1, 0]
+    assert numpy.allclose([r["coverage"] for r in rows], [0.75, 0.0])
+
+
+def test_of_book_stored(tmp_path, monkeypatch):
+    book = Moby("test", TEST_PATH, cache_dir=str(tmp_path), annotations={"sents"})
+    built = SentenceMatrix.of_book(book)
+    assert book.vector_store.names() == ["test.sentences"]
+    # a warm book reads its sentences without the model
+    no_model(monkeypatch)
+    fresh = Moby("test", TEST_PATH, cache_dir=str(tmp_path), annotations={"sents"})
+    loaded = SentenceMatrix.of_book(fresh)
+    assert numpy.array_equal(loaded.vectors, built.vectors)
+    assert numpy.array_equal(loaded.chapter, built.chapter)
+    assert loaded.texts == built.texts and loaded.chapters == built.chapters
@@ -0,0 +1,38 @@
+from bench import bench_book, compare, scaled_book
+from moby import read_chapters
+
+TEST_PATH = "/script/data/test.txt"
+
+
+def test_scaled_book(tmp_path):
+    path = scaled_book(TEST_PATH, 3, str(tmp_path))
+    chapters = list(read_chapters(TEST_PATH))
+    scaled = list(read_chapters(path))
+    assert len(scaled) == 3 * len(chapters)
+    assert [key for key, _ in scaled][-1] == f"chapter_{3 * len(chapters)}"
+    # every copy differs so none of them share a cached parse
+    assert len({text for _, text in scaled}) == len(scaled)
+
+
+def test_bench_book(tmp_path):
+    results = bench_book(("test", TEST_PATH, str(tmp_path), 1))
+    stages = [r["stage"] for r in results]
+    assert stages[:4] == ["load model", "load syllables", "split", "parse"]
+    assert {"count_tokens", "statistics", "freq", "sent_data", "sim"} <= set(stages)
+    parse = results[3]
+    assert parse["tokens"] > 0 and parse["tokens_per_sec"] > 0
+    assert all(r["seconds"] >= 0 and r["peak_rss_mb"] > 0 for r in results)
+
+
+def test_compare():
+    baseline = [
+        {"case": "a", "stage": "parse", "seconds": 1.0},
+        {"case": "a", "stage": "load", "seconds": 1.0},
+    ]
+    results = [
+        {"case": "a", "stage": "parse", "seconds": 1.1},
+        {"case": "a", "stage": "load", "seconds": 1.5},
+        {"case": "b", "stage": "parse", "seconds": 9.0},
+    ]
+    regressions = compare(results, baseline, tolerance=1.2)
+    assert [(r["stage"], r["baseline_seconds"]) for r in regressions] == [("load", 1.0)]
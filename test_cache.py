@@ -0,0 +1,39 @@
+from cache import Cache, MetricsCache, digest
+
+
+def test_digest_separates_parts():
+    assert digest("ab", "c") != digest("a", "bc")
+    assert digest("a", "b") == digest("a", "b")
+
+
+def test_get_put(tmp_path):
+    c = Cache(str(tmp_path))
+    key = digest("chapter")
+    assert c.get(key, "spacy") is None
+    c.put(key, "spacy", b"doc")
+    assert c.get(key, "spacy") == b"doc"
+    assert c.path(key, "spacy").startswith(str(tmp_path / key[:2]))
+
+
+def test_metrics_cache_bounded():
+    m = MetricsCache(maxsize=2)
+    m["a"] = 1
+    m["b"] = 2
+    assert m["a"] == 1
+    m["c"] = 3
+    # b was least recently used
+    assert "b" not in m
+    assert "a" in m and "c" in m
+    m.clear()
+    assert "a" not in m
+
+
+def test_metrics_cache_persists(tmp_path):
+    c = Cache(str(tmp_path))
+    m = MetricsCache()
+    m.bind(c, digest("book"))
+    m["count_words"] = 18
+    loaded = MetricsCache()
+    loaded.bind(c, digest("book"))
+    assert loaded.bound
+    assert loaded["count_words"] == 18
@@ -0,0 +1,32 @@
+import json
+import os
+
+from charts import render
+
+
+def test_render(tmp_path):
+    rows = [
+        {"title": "a", "word": "pip", "bin_start": 0.0, "bin_end": 0.5, "count": 1},
+        {"title": "a", "word": "pip", "bin_start": 0.5, "bin_end": 1.0, "count": 3},
+    ]
+    jobs = [
+        ("index", rows, "pip", str(tmp_path / "pip_hist.html")),
+        ("chapter", rows, "pip", str(tmp_path / "pip_index_hist.html")),
+    ]
+    lines = [
+        {"title": "a", "chapter": 1, "norm_index": 0.25, "flesch_reading_ease": 70.0},
+        {"title": "a", "chapter": 2, "norm_index": 0.75, "flesch_reading_ease": None},
+    ]
+    for kind in ["index line", "chapter line"]:
+        path = str(tmp_path / f"{kind.replace(' ', '_')}.html")
+        jobs.append((kind, lines, "flesch_reading_ease", path))
+    paths = render(jobs, processes=2)
+    assert paths == [job[3] for job in jobs]
+    for path in paths:
+        assert os.path.getsize(path) > 0
+    # histograms load their rows from a data file rather than embed them
+    with open(tmp_path / "pip_hist.json") as fh:
+        assert json.load(fh) == rows
+    with open(tmp_path / "pip_hist.html") as fh:
+        html = fh.read()
+    assert '"url": "pip_hist.json"' in html and '"values"' not in html
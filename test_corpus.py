@@ -0,0 +1,31 @@
+from corpus import Corpus, read_manifest, top_by
+
+TEST_PATH = "/script/data/test.txt"
+
+
+def test_read_manifest(tmp_path):
+    path = tmp_path / "books.tsv"
+    path.write_text(f"# title\tpath\none\t{TEST_PATH}\ntwo\t{TEST_PATH}\n")
+    assert read_manifest(str(path)) == {"one": TEST_PATH, "two": TEST_PATH}
+
+
+def test_corpus(tmp_path):
+    c = Corpus(
+        {"one": TEST_PATH, "two": TEST_PATH},
+        limiter=1,
+        cache_dir=str(tmp_path),
+        processes=2,
+    )
+    statistics = c.statistics()
+    assert list(statistics) == ["one", "two"]
+    assert statistics["one"]["# chapters"] == 1
+    assert statistics["one"] == statistics["two"]
+    assert set(c.indexes()) == {"one", "two"}
+    for counts in c.verb().values():
+        assert counts["one"] == counts["two"]
+
+
+def test_top_by():
+    combined = {"ahab": {"a": 1, "o": 9}, "pip": {"a": 3, "o": 2}}
+    assert [word for word, _ in top_by(combined, "a")] == ["pip", "ahab"]
+    assert [word for word, _ in top_by(combined, "o")] == ["ahab", "pip"]
@@ -0,0 +1,53 @@
+import csv
+from collections import Counter
+
+from dataset import SPLITS, export, sentence_lemmas, shard_paths, split_of
+from moby import Moby
+
+TEST_PATH = "/script/data/test.txt"
+
+
+def _rows(paths):
+    rows = []
+    for path in paths:
+        with open(path) as fh:
+            rows += [tuple(row) for row in csv.reader(fh, delimiter="\t")]
+    return rows
+
+
+def test_split_of():
+    assert split_of("chapter_1", "call ishmael") == split_of(
+        "chapter_1", "call ishmael"
+    )
+    splits = Counter(split_of("chapter_1", str(i)) for i in range(10000))
+    for name, share in SPLITS:
+        assert abs(splits[name] / 10000 - share) < 0.02
+
+
+def test_sentence_lemmas():
+    book = Moby("test", TEST_PATH, annotations={"sents", "lemmas"})
+    for chapter, table in book.chapter_tables():
+        expected = [
+            " ".join(
+                t.lemma_
+                for t in s
+                if not t.is_space and not t.is_punct and not t.is_stop
+            )
+            for s in book.ch_doc[chapter].sents
+        ]
+        assert list(sentence_lemmas(table)) == expected
+
+
+def test_export(tmp_path):
+    single = str(tmp_path / "single")
+    counts = export("test", TEST_PATH, single, cache_dir=str(tmp_path / "cache"))
+    rows = _rows(shard_paths(single).values())
+    assert len(rows) == sum(counts.values()) > 0
+    sharded = str(tmp_path / "sharded")
+    export("test", TEST_PATH, sharded, cache_dir=str(tmp_path / "cache"), shards=2)
+    paths = [p for shard in range(2) for p in shard_paths(sharded, shard, 2).values()]
+    assert sorted(_rows(paths)) == sorted(rows)
+    # a second export writes exactly the same files
+    again = str(tmp_path / "again")
+    export("test", TEST_PATH, again, cache_dir=str(tmp_path / "cache"))
+    assert _rows(shard_paths(again).values()) == rows
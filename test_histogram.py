@@ -0,0 +1,36 @@
+import numpy
+
+from histogram import bin_counts, bin_edges, bin_rows, merge_rows
+
+
+def test_bin_counts():
+    values = numpy.array([0.0, 0.05, 0.5, 0.99, 1.0, 0.35, 1.5])
+    groups = numpy.array([0, 0, 0, 0, 0, 1, 1])
+    edges = bin_edges(0, 1, 10)
+    counts = bin_counts(values, groups, 2, edges)
+    assert counts.shape == (2, 10)
+    assert counts[0].tolist() == numpy.histogram(values[:5], edges)[0].tolist()
+    # values past the last edge are dropped
+    assert counts[1].sum() == 1 and counts[1, 3] == 1
+
+
+def test_bin_rows():
+    edges = bin_edges(0, 1, 10)
+    counts = numpy.zeros((2, 10), dtype="int64")
+    counts[1, 2] = 4
+    rows = bin_rows([{"word": "ahab"}, {"word": "pip"}], edges, counts)
+    assert rows == [{"word": "pip", "bin_start": 0.2, "bin_end": 0.3, "count": 4}]
+
+
+def test_merge_rows():
+    rows = [
+        {"title": "a", "word": "pip", "bin_start": 0.0, "bin_end": 0.5, "count": 1},
+        {"title": "a", "word": "ahab", "bin_start": 0.0, "bin_end": 0.5, "count": 2},
+        {"title": "a", "word": "ahab", "bin_start": 0.5, "bin_end": 1.0, "count": 3},
+        {"title": "o", "word": "pip", "bin_start": 0.0, "bin_end": 0.5, "count": 4},
+    ]
+    assert merge_rows(rows, ["title"]) == [
+        {"title": "a", "bin_start": 0.0, "bin_end": 0.5, "count": 3},
+        {"title": "a", "bin_start": 0.5, "bin_end": 1.0, "count": 3},
+        {"title": "o", "bin_start": 0.0, "bin_end": 0.5, "count": 4},
+    ]
@@ -0,0 +1,66 @@
+from ingest import chapters, heading_number, ingest, join_lines, roman_to_int
+from moby import ChapterText
+
+RAW = """The Project Gutenberg Etext of a Book
+Chapter 12 is mentioned up here.
+
+CONTENTS
+
+CHAPTER I. A Start
+CHAPTER II. An End
+
+CHAPTER I. A Start
+
+It was a dark and stormy night; the rain fell in tor-
+rents, except at occasional intervals--when it was
+checked.
+
+Where the third chapter is mentioned.
+
+CHAPTER II. An End
+
+The end, as in Carnegie-
+Mellon.
+
+End of The Project Gutenberg Etext of a Book
+CHAPTER III.
+
+License text.
+"""
+
+
+def test_heading_number():
+    assert roman_to_int("xiv") == 14 and roman_to_int("XL") == 40
+    assert heading_number("CHAPTER 1") == (1, "")
+    assert heading_number("Chapter XIV. The Cabin") == (14, "The Cabin")
+    assert heading_number("chapter 3 is only mentioned here.") is None
+    assert heading_number("Loomings") is None
+
+
+def test_join_lines():
+    assert join_lines(["rain fell in tor-", "rents"]) == "rain fell in torrents"
+    assert join_lines(["intervals--", "when"]) == "intervals-- when"
+    assert join_lines(["Carnegie-", "Mellon"]) == "Carnegie-Mellon"
+    assert join_lines([" a ", "b"]) == "a b"
+
+
+def test_chapters():
+    book = list(chapters(RAW.splitlines()))
+    assert [n for n, _ in book] == [1, 2]
+    assert book[0][1] == [
+        "A Start",
+        "It was a dark and stormy night; the rain fell in torrents, except at "
+        "occasional intervals--when it was checked.",
+        "Where the third chapter is mentioned.",
+    ]
+    assert book[1][1] == ["An End", "The end, as in Carnegie-Mellon."]
+
+
+def test_ingest(tmp_path):
+    raw = tmp_path / "book.raw"
+    raw.write_bytes(RAW.replace("\n", "\r\n").encode("utf-8"))
+    out = tmp_path / "clean"
+    assert ingest([str(raw)], str(out), 1) == [(str(out / "book.txt"), 2)]
+    text = ChapterText(str(out / "book.txt"))
+    assert list(text) == ["chapter_1", "chapter_2"]
+    assert "torrents" in text["chapter_1"]
@@ -0,0 +1,48 @@
+import json
+
+import numpy
+
+from instrument import span, tracing
+from moby import Moby
+
+TEST_PATH = "/script/data/test.txt"
+
+
+def test_span_without_trace():
+    with span("stage", tokens=1) as fields:
+        fields["chapters"] = 2
+    assert fields == {"tokens": 1, "chapters": 2}
+
+
+def test_tracing(tmp_path):
+    with tracing(memory=True) as t:
+        with span("outer"):
+            with span("inner", chapter="chapter_1") as fields:
+                fields["tokens"] = 3
+    assert [e["name"] for e in t.events] == ["inner", "outer"]
+    inner, outer = t.events
+    assert (inner["depth"], outer["depth"]) == (1, 0)
+    assert inner["chapter"] == "chapter_1" and inner["tokens"] == 3
+    assert outer["seconds"] >= inner["seconds"]
+    assert outer["rss_mb"] > 0 and "heap_peak_mb" in outer
+    assert t.summary()["inner"]["count"] == 1
+    path = str(tmp_path / "trace.json")
+    t.write(path)
+    with open(path) as fh:
+        assert len(json.load(fh)["events"]) == 2
+
+
+def test_traced_parse():
+    plain = Moby("test", TEST_PATH, annotations={"sents", "lemmas"})
+    with tracing() as t:
+        traced = Moby("test", TEST_PATH, annotations={"sents", "lemmas"})
+        traced.statistics()
+    names = set(t.summary())
+    assert {"split chapters", "parse chapter", "component tokenizer"} <= names
+    assert {"component lemmatizer", "component sentencizer", "totals"} <= names
+    assert "component parser" not in names
+    # running the components one by one parses the same as nlp.pipe
+    for column in ["lemma", "pos", "sent_start"]:
+        assert numpy.array_equal(
+            getattr(plain.token_table, column), getattr(traced.token_table, column)
+        )
@@ -1,5 +1,50 @@
+import json
+import os
+import subprocess
+import sys
+
+import fire  # type: ignore
+
 import main
 
 
 def test_noop():
     assert main.noop() == None
+
+
+def test_import_defers_heavy_modules():
+    heavy = "{'spacy', 'pandas', 'gensim', 'altair'}"
+    probe = f"import sys, main; print(sorted({heavy} & set(sys.modules)))"
+    out = subprocess.run(
+        [sys.executable, "-c", probe],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert out.stdout.strip() == "[]"
+
+
+def test_groups():
+    assert main._groups(["ahab", ["flask", "pip"], ("jonah",)]) == [
+        ["ahab"],
+        ["flask", "pip"],
+        ["jonah"],
+    ]
+    # a single --terms=ahab reaches the command as a string
+    assert fire.Fire(main._groups, ["--terms=ahab"]) == [["ahab"]]
+    assert fire.Fire(main._groups, ["--terms=[ahab,[flask,pip]]"]) == [
+        ["ahab"],
+        ["flask", "pip"],
+    ]
+
+
+def test_trace_corpus_in_process(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "CACHE_DIR", str(tmp_path / "cache"))
+    manifest = tmp_path / "books.tsv"
+    manifest.write_text("one\t/script/data/test.txt\ntwo\t/script/data/test.txt\n")
+    out = str(tmp_path / "trace.json")
+    main.trace("table", str(manifest), processes=2, out=out)
+    with open(out) as fh:
+        names = {event["name"] for event in json.load(fh)["events"]}
+    assert {"parse chapter", "component tokenizer", "totals"} <= names
@@ -1,4 +1,12 @@
-from moby import Moby
+import gc
+import weakref
+
+import numpy
+import pytest
+import spacy
+
+import moby
+from moby import ChapterText, Moby, Syllables, load_syllables, read_chapters
 
 TEST_PATH = "/script/data/test.txt"
 
@@ -14,3 +22,201 @@ def test_init_w_limit():
     t = Moby("testbook", TEST_PATH, 1)
     assert len(t.ch_text.keys()) == 1
     assert len(t.ch_doc["chapter_1"]) == 12
+
+
+def test_init_cache(tmp_path):
+    cold = Moby("testbook", TEST_PATH, cache_dir=str(tmp_path))
+    cold.ch_doc.materialize()
+    warm = Moby("testbook", TEST_PATH, cache_dir=str(tmp_path))
+    # chapters are content addressed, identical texts share an entry
+    assert len(list(tmp_path.glob("*/*.spacy"))) == len(set(cold.ch_text.values()))
+    assert [t.text for t in warm.ch_doc["chapter_2"]] == [
+        t.text for t in cold.ch_doc["chapter_2"]
+    ]
+
+
+def test_init_multiprocess():
+    t = Moby("testbook", TEST_PATH, n_process=2, batch_size=1)
+    assert list(t.ch_doc.keys()) == ["chapter_1", "chapter_2"]
+    assert len(t.ch_doc["chapter_2"]) == 12
+
+
+def test_ch_doc_lazy():
+    t = Moby("testbook", TEST_PATH)
+    assert "chapter_2" in t.ch_doc
+    assert len(t.ch_doc["chapter_1"]) == 12
+    assert list(t.ch_doc._docs) == ["chapter_1"]
+    assert [len(doc) for doc in t.ch_doc.values()] == [12, 12]
+
+
+def test_init_annotations():
+    t = Moby("testbook", TEST_PATH, annotations={"sents"})
+    assert "sentencizer" in t.ch_doc.pipes
+    assert "tagger" not in t.ch_doc.pipes
+    doc = t.ch_doc["chapter_1"]
+    assert len(doc) == 12
+    assert len(list(doc.sents)) == 1
+    assert not doc.has_annotation("TAG")
+
+
+def test_init_unknown_annotation():
+    with pytest.raises(ValueError):
+        Moby("testbook", TEST_PATH, annotations={"coreference"})
+
+
+def test_counts():
+    t = Moby("testbook", TEST_PATH)
+    # "The quick brown fox jumped over the lazy dog." per chapter
+    assert t.count_words() == 18
+    assert t.count_letters() == 2 * len("Thequickbrownfoxjumpedoverthelazydog")
+    assert t.freq({"fox"}, "NNP") == []
+
+
+def test_syllables():
+    s = Syllables({"whale": 1})
+    assert s["whale"] == 1
+    assert s["harpooneer"] == Moby.naive_syl("harpooneer")
+    assert list(s.count(["whale", "whale"])) == [1, 1]
+    assert Syllables.from_bytes(s.to_bytes()).known == s.known
+
+
+def test_load_syllables_persists(tmp_path):
+    syllables = load_syllables(str(tmp_path))
+    assert syllables["whale"] == Moby.cmu_syl("whale")
+    assert len(list(tmp_path.glob("*/*.json"))) == 1
+
+
+def test_read_chapters(tmp_path):
+    path = tmp_path / "book.txt"
+    path.write_bytes(
+        "Title\r\nCHAPTER 1\r\nCall me Ishmael.\r\nchapter 2 Loomings\n".encode()
+    )
+    assert list(read_chapters(str(path))) == [
+        ("chapter_1", "\nCall me Ishmael.\n"),
+        ("chapter_2", " Loomings\n"),
+    ]
+    assert list(read_chapters(str(path), 1)) == [("chapter_1", "\nCall me Ishmael.\n")]
+    text = ChapterText(str(path))
+    assert list(text) == ["chapter_1", "chapter_2"]
+    assert text["chapter_2"] == " Loomings\n"
+
+
+def test_ch_doc_stream():
+    t = Moby("testbook", TEST_PATH)
+    streamed = [(ch, len(doc)) for ch, doc in t.ch_doc.stream()]
+    assert streamed == [("chapter_1", 12), ("chapter_2", 12)]
+    assert t.ch_doc._docs == {}
+
+
+def test_reload(tmp_path):
+    path = tmp_path / "book.txt"
+    text = open(TEST_PATH).read()
+    path.write_text(text)
+    t = Moby("testbook", str(path), cache_dir=str(tmp_path / "cache"))
+    assert t.count_words() == 18
+    # counts stream the chapters rather than build the book's table
+    assert t._token_table is None
+    path.write_text(text.replace("lazy dog.\n", "lazy old dog. Ahab went.\n", 1))
+    assert t.reload() == ["chapter_1"]
+    fresh = Moby("testbook", str(path))
+    for count in ["count_tokens", "count_words", "count_letters", "count_syllables"]:
+        assert getattr(t, count)() == getattr(fresh, count)()
+    assert t.propn() == fresh.propn()
+    assert t.verb() == fresh.verb()
+    assert (t.token_table.lower == fresh.token_table.lower).all()
+    assert t.freq({"ahab"}, "NNP") == fresh.freq({"ahab"}, "NNP")
+    assert t.reload() == []
+    # with the table built, a reload updates its columns in place
+    path.write_text(text)
+    assert t.reload() == ["chapter_1"]
+    assert t.count_words() == 18
+    assert (t.token_table.lower == Moby("testbook", TEST_PATH).token_table.lower).all()
+
+
+def test_metrics_do_not_keep_books_alive():
+    t = Moby("testbook", TEST_PATH)
+    assert t.count_words() == 18
+    assert "count_words" in t.metrics
+    ref = weakref.ref(t)
+    del t
+    gc.collect()
+    assert ref() is None
+
+
+def test_metrics_persist(tmp_path, monkeypatch):
+    t = Moby("testbook", TEST_PATH, cache_dir=str(tmp_path))
+    ease = t.flesch_reading_ease()
+    warm = Moby("testbook", TEST_PATH, cache_dir=str(tmp_path))
+    warm.metrics.bind(warm.cache, warm.metrics_key())
+    assert warm.metrics["flesch_reading_ease"] == ease
+    # new syllable rules count again rather than serve the stored metrics
+    key = warm.metrics_key()
+    monkeypatch.setattr(Syllables, "VERSION", Syllables.VERSION + "-next")
+    assert warm.metrics_key() != key
+
+
+def no_model(monkeypatch):
+    """Makes loading the model fail, for runs that should not need it."""
+
+    def load(*args, **kwargs):
+        raise AssertionError("the model was loaded")
+
+    monkeypatch.setattr(spacy, "load", load)
+    monkeypatch.setattr(moby, "load_nlp", load)
+
+
+def test_warm_metrics_do_not_load_model(tmp_path, monkeypatch):
+    cold = Moby("testbook", TEST_PATH, cache_dir=str(tmp_path))
+    table = dict(cold.statistics(), **cold.indexes())
+    no_model(monkeypatch)
+    warm = Moby("testbook", TEST_PATH, cache_dir=str(tmp_path))
+    assert warm.key() == cold.key()
+    assert dict(warm.statistics(), **warm.indexes()) == table
+
+
+def test_freq_bins():
+    m = Moby("test", TEST_PATH)
+    words, tag = {"fox", "dog", "cat"}, "NN"
+    hits = m.freq(words, tag)
+    assert hits
+    by_index = m.freq_bins(words, tag, bins=5)
+    assert sum(row["count"] for row in by_index) == len(hits)
+    for row in by_index:
+        assert row["count"] == sum(
+            1
+            for hit in hits
+            if hit["word"] == row["word"]
+            and row["bin_start"] <= hit["norm_index"] < row["bin_end"]
+        )
+    by_chapter = m.freq_bins(words, tag, by="chapter", per_word=False)
+    assert sum(row["count"] for row in by_chapter) == len(hits)
+    assert all(
+        set(row) == {"title", "bin_start", "bin_end", "count"} for row in by_chapter
+    )
+    with pytest.raises(ValueError):
+        m.freq_bins(words, tag, by="sentence")
+
+
+def test_chapter_vectors_stored(tmp_path, monkeypatch):
+    m = Moby("test", TEST_PATH, cache_dir=str(tmp_path), annotations={"tokens"})
+    expected = numpy.array([doc.vector for doc in m.ch_doc.values()])
+    assert numpy.allclose(m.chapter_vectors(), expected)
+    no_model(monkeypatch)
+    fresh = Moby("test", TEST_PATH, cache_dir=str(tmp_path), annotations={"tokens"})
+    assert numpy.allclose(fresh.chapter_vectors(), expected)
+    assert fresh.vector_store.names() == ["test.chapters"]
+
+
+def test_readability():
+    t = Moby("testbook", TEST_PATH)
+    chapters = t.readability()
+    assert [row["chapter"] for row in chapters] == [1, 2]
+    assert sum(row["words"] for row in chapters) == t.count_words()
+    assert sum(row["sentences"] for row in chapters) == t.count_sentences()
+    # one window over the whole book scores the same as the book
+    (book,) = t.readability(window=len(t.token_table))
+    assert book["flesch_reading_ease"] == pytest.approx(t.flesch_reading_ease())
+    assert book["automated_readability_index"] == pytest.approx(
+        t.automated_readablitity_index()
+    )
+    assert len(t.readability(window=6, step=3)) == 7
@@ -0,0 +1,59 @@
+import numpy
+import pytest
+
+import ngrams
+from moby import Moby
+from ngrams import NGrams, collocations, diff, mix
+
+TEST_PATH = "/script/data/test.txt"
+
+
+def test_mix():
+    parts = numpy.array([[1, 2], [2, 1], [1, 2]], dtype="uint64")
+    ids = mix(parts)
+    assert ids[0] == ids[2] and ids[0] != ids[1]
+    assert mix(parts[:, :1])[0] != mix(parts[:, 1:])[0]
+
+
+def test_count(monkeypatch):
+    # merging after every chapter counts the same as merging once
+    monkeypatch.setattr(ngrams, "MERGE_EVERY", 1)
+    grams = NGrams.of_book(Moby("testbook", TEST_PATH), 3, "lower")
+    assert grams[1].total == 18 and grams[2].total == 16 and grams[3].total == 14
+    counts = dict(zip(grams[2].texts(), grams[2].counts))
+    assert counts["the quick"] == 2 and counts["lazy dog"] == 2
+    # punctuation ends a run, so no n-gram reaches into the full stop
+    assert not any("." in text for text in grams[3].texts())
+    assert list(grams[1].lookup(mix(grams[1].parts))) == list(grams[1].counts)
+
+
+def test_filters():
+    book = Moby("testbook", TEST_PATH)
+    grams = NGrams.of_book(book, 2, "lower", stop=False)
+    assert "the" not in grams[1].texts()
+    assert "fox jumped" in grams[2].texts()
+    assert "jumped over" not in grams[2].texts()
+    with pytest.raises(ValueError):
+        NGrams.of_book(book, 2, "text")
+
+
+def test_cached(tmp_path):
+    cold = NGrams.of_book(Moby("testbook", TEST_PATH, cache_dir=str(tmp_path)), 2)
+    warm = NGrams.of_book(Moby("testbook", TEST_PATH, cache_dir=str(tmp_path)), 2)
+    for n in (1, 2):
+        assert (cold[n].ids == warm[n].ids).all()
+        assert (cold[n].counts == warm[n].counts).all()
+        assert cold[n].texts() == warm[n].texts()
+
+
+def test_collocations_and_diff():
+    grams = NGrams.of_book(Moby("testbook", TEST_PATH), 2, "lower")
+    rows = {row["ngram"]: row for row in collocations(grams, 2)}
+    # 2 of 16 bigrams, "the" is 4 and "quick" 2 of the words
+    assert rows["the quick"]["pmi"] == pytest.approx(numpy.log2(2 * 16 / (4 * 2)))
+    assert all(row["llr"] >= 0 for row in rows.values())
+    half = NGrams.of_book(Moby("testbook", TEST_PATH, 1), 2, "lower")
+    cut = diff(grams, half, 2, min_count=2)
+    assert [row["abridged"] for row in cut] == [1] * 8
+    # the same rate in both books, half the book has half the n-grams
+    assert cut[0]["original per million"] == cut[0]["abridged per million"]
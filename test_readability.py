@@ -0,0 +1,54 @@
+import numpy
+import pytest
+
+from readability import PrefixCounts, profile, scores, windows
+
+
+def test_prefix_counts():
+    # two sentences, the fourth token is not a word
+    prefix = PrefixCounts(
+        numpy.array([3, 5, 2, 0, 4]),
+        numpy.array([1, 1, 1, 0, 1]),
+        numpy.array([1, 2, 1, 0, 1]),
+        numpy.array([0, 0, 0, 0, 1]),
+    )
+    counts = prefix.counts(numpy.array([0, 1, 2]), numpy.array([5, 3, 2]))
+    assert counts["letters"].tolist() == [14, 7, 0]
+    assert counts["words"].tolist() == [4, 2, 0]
+    assert counts["syllables"].tolist() == [5, 3, 0]
+    assert counts["sentences"].tolist() == [2, 1, 0]
+
+
+def test_scores():
+    counts = {
+        "letters": numpy.array([40, 0]),
+        "words": numpy.array([10, 0]),
+        "sentences": numpy.array([2, 0]),
+        "syllables": numpy.array([15, 0]),
+    }
+    result = scores(counts)
+    assert result["flesch_reading_ease"][0] == pytest.approx(
+        206.835 - 1.015 * 5 - 84.6 * 1.5
+    )
+    assert result["automated_readability_index"][0] == pytest.approx(
+        4.71 * 4 + 0.5 * 5 - 21.43
+    )
+    assert numpy.isnan(result["flesch_kincaid_reading_age"][1])
+
+
+def test_windows():
+    assert windows(10, 4).tolist() == [[0, 2, 4, 6], [4, 6, 8, 10]]
+    assert windows(10, 4, 3).tolist() == [[0, 3, 6], [4, 7, 10]]
+    assert windows(11, 4).tolist() == [[0, 2, 4, 6, 7], [4, 6, 8, 10, 11]]
+    assert windows(3, 4).tolist() == [[0], [3]]
+    with pytest.raises(ValueError):
+        windows(10, 0)
+
+
+def test_profile():
+    prefix = PrefixCounts(*[numpy.array([1, 1]) for _ in range(3)], numpy.zeros(2))
+    rows = profile(
+        prefix, numpy.array([0, 1]), numpy.array([2, 1]), [{"w": 0}, {"w": 1}]
+    )
+    assert rows[0]["w"] == 0 and rows[0]["words"] == 2
+    assert rows[1]["words"] == 0 and rows[1]["flesch_reading_ease"] is None
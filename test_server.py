@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+from server import Server
+from test_moby import no_model
+
+TEST_PATH = "/script/data/test.txt"
+
+
+async def _get(port, path, body=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    data = json.dumps(body).encode("utf-8") if body is not None else b""
+    method = "POST" if body is not None else "GET"
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nContent-Length: {len(data)}\r\n\r\n".encode()
+        + data
+    )
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(payload)
+
+
+def test_server(tmp_path):
+    server = Server(
+        {"a": TEST_PATH, "b": TEST_PATH}, cache_dir=str(tmp_path), processes=2
+    )
+
+    async def run():
+        tcp = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+        port = tcp.sockets[0].getsockname()[1]
+        # concurrent queries share one load of each book
+        answers = await asyncio.gather(
+            _get(port, "/freq?words=fox,dog&tag=NN&bins=2"),
+            _get(port, "/table", {"titles": ["a"]}),
+            _get(port, "/sim?titles=a,b&top_k=1"),
+            _get(port, "/nope"),
+            _get(port, "/table?titles=c"),
+            _get(port, "/freq"),
+        )
+        tcp.close()
+        return answers
+
+    try:
+        freq, table, sim, unknown, missing, bad = asyncio.run(run())
+    finally:
+        server.close()
+    assert freq[0] == 200
+    assert freq[1]["counts"] == {"a": {"fox": 2, "dog": 2}, "b": {"fox": 2, "dog": 2}}
+    assert sum(row["count"] for row in freq[1]["bins"]) == 8
+    assert table[0] == 200 and list(table[1]) == ["a"]
+    assert table[1]["a"]["# chapters"] == 2
+    assert sim[0] == 200 and sim[1]["chapter_1"][0][1] > 0.99
+    assert unknown[0] == 404 and missing[0] == 404 and bad[0] == 400
+    assert len(server.books) == 2
+
+
+def test_warm_does_not_load_model(tmp_path, monkeypatch):
+    server = Server({"a": TEST_PATH}, cache_dir=str(tmp_path), processes=1)
+    # the workers are forked already, only the server itself is patched
+    no_model(monkeypatch)
+    try:
+        asyncio.run(server.warm())
+    finally:
+        server.close()
+    assert server.books["a"].totals.words == 18
@@ -0,0 +1,30 @@
+import numpy
+
+from similarity import cosine_matrix, top_k, unit_rows, write_matrix
+
+
+def test_cosine_matrix():
+    a = numpy.array([[1.0, 0.0], [1.0, 1.0], [0.0, 0.0]])
+    b = numpy.array([[2.0, 0.0], [0.0, 3.0]])
+    m = cosine_matrix(a, b)
+    assert m.shape == (3, 2)
+    assert numpy.allclose(m[0], [1.0, 0.0])
+    assert numpy.allclose(m[1], [numpy.sqrt(0.5), numpy.sqrt(0.5)])
+    # chapters without vectors compare as 0 rather than nan
+    assert numpy.allclose(m[2], [0.0, 0.0])
+    assert numpy.allclose(numpy.linalg.norm(unit_rows(b), axis=1), 1.0)
+
+
+def test_top_k():
+    m = numpy.array([[0.1, 0.9, 0.5], [0.7, 0.2, 0.3]])
+    indices, scores = top_k(m, 2)
+    assert indices.tolist() == [[1, 2], [0, 2]]
+    assert numpy.allclose(scores, [[0.9, 0.5], [0.7, 0.3]])
+    assert top_k(m, 5)[0].shape == (2, 3)
+
+
+def test_write_matrix(tmp_path):
+    path = str(tmp_path / "sim.tsv")
+    write_matrix(path, ["a1"], ["b1", "b2"], numpy.array([[0.5, 0.25]]))
+    with open(path) as fh:
+        assert fh.read().splitlines() == ["\tb1\tb2", "a1\t0.500000\t0.250000"]
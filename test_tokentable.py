@@ -0,0 +1,41 @@
+from moby import Moby
+from tokentable import FreqIndex, TokenTable
+
+TEST_PATH = "/script/data/test.txt"
+
+
+def test_table_matches_docs():
+    m = Moby("testbook", TEST_PATH)
+    t = m.token_table
+    docs = list(m.ch_doc.values())
+    assert len(t) == sum(len(doc) for doc in docs)
+    assert t.chapters == ["chapter_1", "chapter_2"]
+    assert list(t.offsets) == [0, 12, 24]
+    assert int(t.words.sum()) == sum(
+        1 for doc in docs for tok in doc if not tok.is_punct and not tok.is_space
+    )
+    assert t.count_sentences() == sum(len(list(doc.sents)) for doc in docs)
+    assert t.counts("lower", t.words)["fox"] == 2
+
+
+def test_round_trip():
+    t = Moby("testbook", TEST_PATH).token_table
+    loaded = TokenTable.from_bytes(t.to_bytes())
+    assert loaded.chapters == t.chapters
+    assert (loaded.lemma == t.lemma).all()
+    assert (loaded.sentence == t.sentence).all()
+    assert loaded.strings == t.strings
+    assert loaded.hash_of("quick") == t.hash_of("quick")
+
+
+def test_freq_index():
+    t = Moby("testbook", TEST_PATH).token_table
+    index = FreqIndex(t)
+    tag = t.strings[int(t.tag[t.lower == t.hash_of("fox")][0])]
+    hits = index.positions({"fox", "dog", "kraken"}, tag)
+    assert list(hits) == sorted(hits)
+    assert all(t.strings[int(t.lower[i])] in ("fox", "dog") for i in hits)
+    assert index.counts({"fox", "kraken"}, tag) == {"fox": 2, "kraken": 0}
+    assert index.counts({"fox"}, "NOT-A-TAG") == {"fox": 0}
+    loaded = FreqIndex.from_bytes(t, index.to_bytes())
+    assert list(loaded.positions({"fox"}, tag)) == list(index.positions({"fox"}, tag))
@@ -0,0 +1,50 @@
+import csv
+
+import numpy
+
+from moby import Moby
+from topics import TopicModel, sentence_tokens
+
+TEST_PATH = "/script/data/test.txt"
+
+
+def test_sentence_tokens():
+    book = Moby("test", TEST_PATH, annotations={"sents", "lemmas"})
+    tokens = [" ".join(lemmas) for _, lemmas in sentence_tokens(book)]
+    # sentences without content words are left out
+    assert tokens == [r["unigram_text"] for r in book.sent_data() if r["unigram_text"]]
+
+
+def test_topic_model(tmp_path):
+    out_dir = str(tmp_path / "topics")
+    books = [
+        Moby(title, TEST_PATH, cache_dir=str(tmp_path), annotations={"lemmas"})
+        for title in ["one", "two"]
+    ]
+    model = TopicModel(books, out_dir, num_topics=2, workers=1).train()
+    path = str(tmp_path / "chapter_topics.tsv")
+    model.write_chapter_topics(path)
+    with open(path) as fh:
+        rows = list(csv.reader(fh, delimiter="\t"))
+    assert rows[0] == ["title", "chapter", "topic_0", "topic_1"]
+    assert {row[0] for row in rows[1:]} == {"one", "two"}
+    for row in rows[1:]:
+        assert abs(sum(float(p) for p in row[2:]) - 1) < 1e-3
+    # the same books and settings load the saved models
+    again = TopicModel(books, out_dir, num_topics=2, workers=1).train()
+    assert numpy.allclose(again.lda.get_topics(), model.lda.get_topics())
+    assert len(again.dictionary) == len(model.dictionary)
+
+
+def test_topic_model_parses_once(tmp_path, monkeypatch):
+    parsed = []
+    make = Moby._make_chapter_tables
+
+    def counted(self, chapters):
+        parsed.append(self.title)
+        return make(self, chapters)
+
+    monkeypatch.setattr(Moby, "_make_chapter_tables", counted)
+    books = [Moby(t, TEST_PATH, annotations={"lemmas"}) for t in ["one", "two"]]
+    TopicModel(books, str(tmp_path), num_topics=2, workers=1).train()
+    assert parsed == ["one", "two"]
@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+
+import numpy
+import pytest
+
+from vectorstore import Vectors, VectorStore
+
+
+def test_vectors():
+    v = Vectors(["a", "b"], numpy.array([[1, 2], [3, 4]], dtype="float16"))
+    assert len(v) == 2 and "a" in v and "c" not in v
+    assert v["b"].dtype == numpy.float32 and v["b"].tolist() == [3, 4]
+    assert v.rows(["b", "a"]).tolist() == [[3, 4], [1, 2]]
+    with pytest.raises(ValueError):
+        Vectors(["a"], numpy.zeros((2, 2)))
+
+
+def test_store(tmp_path):
+    store = VectorStore(str(tmp_path))
+    assert store.get("book.chapters") is None
+    matrix = numpy.random.RandomState(0).rand(3, 4).astype("float32")
+    store.put("book.chapters", Vectors(["x", "y", "z"], matrix, {"n": 1}), "src")
+    v = store.get("book.chapters", "src")
+    assert isinstance(v.matrix, numpy.memmap)
+    assert v.keys == ["x", "y", "z"] and v.meta == {"n": 1}
+    assert numpy.array_equal(v.rows(), matrix)
+    assert store.get("book.chapters", "other") is None
+    assert store.names() == ["book.chapters"]
+    half = VectorStore(str(tmp_path), dtype="float16")
+    half.put("book.half", Vectors(["x", "y", "z"], matrix))
+    v = half.get("book.half")
+    assert v.matrix.dtype == numpy.float16
+    assert numpy.allclose(v.rows(), matrix, atol=1e-3)
+    with pytest.raises(ValueError):
+        VectorStore(str(tmp_path), dtype="int8")
+
+
+def test_import_without_spacy():
+    probe = "import sys, vectorstore, align; print('spacy' in sys.modules)"
+    out = subprocess.run(
+        [sys.executable, "-c", probe],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert out.stdout.strip() == "False"
@@ -0,0 +1,24 @@
+import os
+import subprocess
+import sys
+
+from workers import pool_size, run_pool
+
+
+def test_run_pool():
+    jobs = [-3, 2, -1]
+    assert run_pool(abs, jobs, 1) == run_pool(abs, jobs, 2) == [3, 2, 1]
+    assert run_pool(abs, []) == []
+    assert pool_size(None) == pool_size(0) >= 1 and pool_size(3) == 3
+
+
+def test_light_modules_do_not_import_spacy():
+    probe = "import sys, ingest, charts; print('spacy' in sys.modules)"
+    out = subprocess.run(
+        [sys.executable, "-c", probe],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert out.stdout.strip() == "False"
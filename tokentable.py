@@ -0,0 +1,238 @@
+"""
+Columnar token table for a book.
+
+Every token of every chapter becomes one row across a handful of numpy arrays,
+so counting is a reduction over arrays rather than a Python loop over spaCy
+Token objects. The table carries the strings behind its hash columns and does
+not need spaCy once built.
+"""
+import io
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy  # type: ignore
+
+# Token attributes copied out of each doc with Doc.to_array, in column order.
+ATTRS: List[str] = [
+    "LENGTH",
+    "IS_PUNCT",
+    "IS_SPACE",
+    "IS_STOP",
+    "POS",
+    "TAG",
+    "LEMMA",
+    "LOWER",
+    "NORM",
+    "SENT_START",
+]
+# Columns that hold string hashes (POS holds symbol ids which resolve the same).
+HASHED: List[str] = ["pos", "tag", "lemma", "lower", "norm"]
+DTYPES: Dict[str, str] = {
+    "length": "int32",
+    "is_punct": "bool",
+    "is_space": "bool",
+    "is_stop": "bool",
+    "pos": "uint64",
+    "tag": "uint64",
+    "lemma": "uint64",
+    "lower": "uint64",
+    "norm": "uint64",
+    "sent_start": "int8",
+}
+
+
+class TokenTable:
+    """
+    Token attributes of a book as parallel arrays. Besides the ATTRS columns
+    there is chapter, the position of the token's chapter in chapters, and
+    sentence, a sentence number running across the whole book.
+    """
+
+    def __init__(
+        self,
+        columns: Dict[str, numpy.ndarray],
+        strings: Dict[int, str],
+        chapters: List[str],
+        lengths: List[int],
+    ):
+        self.columns = columns
+        self.strings = strings
+        self.chapters = chapters
+        # token offset of each chapter, with the total at the end
+        self.offsets = numpy.concatenate([[0], numpy.cumsum(lengths)]).astype("int64")
+        self.chapter = numpy.repeat(numpy.arange(len(chapters), dtype="int32"), lengths)
+        starts = self.sent_start == 1
+        # the first token of a chapter always starts a sentence
+        starts[self.offsets[:-1][numpy.asarray(lengths) > 0]] = True
+        self.sentence = numpy.cumsum(starts) - 1
+        self._ids: Optional[Dict[str, numpy.uint64]] = None
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def __getattr__(self, name: str) -> numpy.ndarray:
+        # columns read like attributes, table.lemma, table.is_punct, ...
+        columns = self.__dict__.get("columns", {})
+        if name in columns:
+            return columns[name]
+        raise AttributeError(name)
+
+    @property
+    def words(self) -> numpy.ndarray:
+        """Mask of tokens that count as words, not punctuation or whitespace."""
+        return ~self.is_punct & ~self.is_space
+
+    def count_sentences(self) -> int:
+        return int(self.sentence[-1]) + 1 if len(self) else 0
+
+    def chapter_numbers(self) -> numpy.ndarray:
+        """The number in each chapter key, chapter_12 is 12."""
+        return numpy.array([int(ch.split("_")[1]) for ch in self.chapters])
+
+    def chapter_table(self, i: int) -> "TokenTable":
+        """Table of the i-th chapter alone, sharing this table's arrays."""
+        start, end = self.offsets[i], self.offsets[i + 1]
+        columns = {name: column[start:end] for name, column in self.columns.items()}
+        return TokenTable(columns, self.strings, [self.chapters[i]], [end - start])
+
+    def hash_of(self, text: str) -> Optional[numpy.uint64]:
+        """Hash of a string seen in the table, None if no token has it."""
+        # typed as uint64 so comparing with hash columns never goes via float
+        if self._ids is None:
+            self._ids = {s: numpy.uint64(h) for h, s in self.strings.items()}
+        return self._ids.get(text)
+
+    def hashes(self, texts: Iterable[str]) -> numpy.ndarray:
+        ids = [self.hash_of(text) for text in texts]
+        return numpy.array([h for h in ids if h is not None], dtype="uint64")
+
+    def counts(self, column: str, mask: numpy.ndarray) -> Dict[str, int]:
+        """Occurrences of each string of a hash column among masked tokens."""
+        values, counts = numpy.unique(self.columns[column][mask], return_counts=True)
+        return {self.strings[int(h)]: int(c) for h, c in zip(values, counts)}
+
+    def sentence_strings(self, column: str, mask: numpy.ndarray) -> Iterator[List[str]]:
+        """
+        The strings of a hash column of the masked tokens of every sentence, in
+        order. Sentences without masked tokens give an empty list.
+        """
+        if not len(self):
+            return
+        sentence = self.sentence[mask]
+        values = self.columns[column][mask]
+        ids = numpy.arange(int(self.sentence[0]), int(self.sentence[-1]) + 1)
+        # the masked tokens of a sentence are one run of the sorted sentence ids
+        starts = numpy.searchsorted(sentence, ids, side="left")
+        ends = numpy.searchsorted(sentence, ids, side="right")
+        for start, end in zip(starts, ends):
+            yield [self.strings[int(h)] for h in values[start:end]]
+
+    @classmethod
+    def from_doc(cls, doc) -> "TokenTable":
+        """Table of a single chapter doc, the doc is any spacy Doc."""
+        array = doc.to_array(ATTRS).reshape(len(doc), len(ATTRS))
+        columns = {
+            name.lower(): array[:, i].astype(DTYPES[name.lower()])
+            for i, name in enumerate(ATTRS)
+        }
+        strings = {}
+        for name in HASHED:
+            for h in numpy.unique(columns[name]):
+                strings[int(h)] = doc.vocab.strings[int(h)] if h else ""
+        return cls(columns, strings, [""], [len(doc)])
+
+    @classmethod
+    def concat(cls, tables: List["TokenTable"], chapters: List[str]) -> "TokenTable":
+        """
+        Joins single chapter tables, in order, into the table of a book with the
+        given chapter keys. Chapter tables are shared between identical chapter
+        texts, so they do not carry a key of their own.
+        """
+        columns = {
+            name: numpy.concatenate(
+                [t.columns[name] for t in tables]
+                or [numpy.array([], dtype=DTYPES[name])]
+            )
+            for name in DTYPES
+        }
+        strings: Dict[int, str] = {}
+        lengths: List[int] = []
+        for t in tables:
+            strings.update(t.strings)
+            lengths.append(len(t))
+        return cls(columns, strings, chapters, lengths)
+
+    def to_bytes(self) -> bytes:
+        arrays = {
+            "lengths": numpy.diff(self.offsets),
+            "chapters": numpy.array(self.chapters, dtype="U"),
+            "string_keys": numpy.array(list(self.strings.keys()), dtype="uint64"),
+            "string_values": numpy.array(list(self.strings.values()), dtype="U"),
+        }
+        arrays.update(self.columns)
+        buf = io.BytesIO()
+        numpy.savez(buf, **arrays)  # type: ignore
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "TokenTable":
+        with numpy.load(io.BytesIO(data)) as npz:
+            columns = {name: npz[name] for name in DTYPES}
+            strings = {
+                int(h): str(s) for h, s in zip(npz["string_keys"], npz["string_values"])
+            }
+            return cls(
+                columns,
+                strings,
+                [str(ch) for ch in npz["chapters"]],
+                [int(n) for n in npz["lengths"]],
+            )
+
+
+class FreqIndex:
+    """
+    Inverted index from (lowercase form, tag) to token positions of a table.
+    Positions are sorted by lower then tag then position, so the hits for a
+    pair are one contiguous run found by binary search.
+    """
+
+    def __init__(self, table: TokenTable, order: Optional[numpy.ndarray] = None):
+        self.table = table
+        if order is None:
+            # lexsort is stable and sorts by the last key first
+            order = numpy.lexsort((table.tag, table.lower))
+        self.order = order
+        self.lower = table.lower[order]
+        self.tag = table.tag[order]
+
+    def positions(self, words: Iterable[str], tag: str) -> numpy.ndarray:
+        """Sorted positions of tokens whose lowercase form is in words."""
+        runs = [self._run(h, tag) for h in self.table.hashes(words)]
+        return numpy.sort(numpy.concatenate([numpy.array([], dtype="int64")] + runs))
+
+    def counts(self, words: Iterable[str], tag: str) -> Dict[str, int]:
+        """Hits per word, words without any hits count zero."""
+        counts = {}
+        for word in words:
+            h = self.table.hash_of(word)
+            counts[word] = 0 if h is None else len(self._run(h, tag))
+        return counts
+
+    def _run(self, lower: numpy.uint64, tag: str) -> numpy.ndarray:
+        tag_hash = self.table.hash_of(tag)
+        if tag_hash is None:
+            return numpy.array([], dtype="int64")
+        lo = int(numpy.searchsorted(self.lower, lower, side="left"))
+        hi = int(numpy.searchsorted(self.lower, lower, side="right"))
+        tags = self.tag[lo:hi]
+        start = lo + int(numpy.searchsorted(tags, tag_hash, side="left"))
+        end = lo + int(numpy.searchsorted(tags, tag_hash, side="right"))
+        return self.order[start:end]
+
+    def to_bytes(self) -> bytes:
+        buf = io.BytesIO()
+        numpy.save(buf, self.order)
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, table: TokenTable, data: bytes) -> "FreqIndex":
+        return cls(table, numpy.load(io.BytesIO(data)))
@@ -0,0 +1,194 @@
+"""
+Topic models of the sentences of books.
+
+Sentences are read as lists of content word lemmas straight from the cached
+token tables, a chapter at a time, and pass through gensim phrase detection,
+a dictionary, tf-idf and LDA. The bag of words corpus is serialized to disk,
+so training streams it from there rather than holding it in memory. Models are
+saved next to the corpus and reused while the books and settings stay the same.
+"""
+import csv
+import json
+import logging
+import os
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import gensim  # type: ignore
+import numpy  # type: ignore
+
+from cache import digest
+from instrument import span
+from moby import Moby
+
+log = logging.getLogger("topics")
+
+# Parts of speech whose lemmas the topic models see.
+POS = ["ADJ", "NOUN", "PROPN"]
+# bump when the sentence tokens or the training steps change
+VERSION = "1"
+
+
+def sentence_tokens(book: Moby) -> Iterator[Tuple[str, List[str]]]:
+    """
+    (chapter, lemmas) of every sentence of a book, keeping content words.
+    Sentences without any are skipped.
+    """
+    for chapter, table in book.chapter_tables():
+        mask = numpy.isin(table.pos, table.hashes(POS)) & ~table.is_stop
+        mask &= ~table.is_punct
+        for lemmas in table.sentence_strings("lemma", mask):
+            if lemmas:
+                yield chapter, lemmas
+
+
+class Sentences:
+    """
+    The sentences of several books as a restartable iterable of token lists,
+    read again from the token tables on every pass rather than kept.
+    """
+
+    def __init__(self, books: List[Moby]):
+        self.books = books
+
+    def __iter__(self) -> Iterator[List[str]]:
+        for _, _, tokens in self.labeled():
+            yield tokens
+
+    def labeled(self) -> Iterator[Tuple[str, str, List[str]]]:
+        for book in self.books:
+            for chapter, tokens in sentence_tokens(book):
+                yield book.title, chapter, tokens
+
+
+class TopicModel:
+    """
+    Phrases, dictionary, tf-idf and LDA models of the sentences of some books,
+    kept in out_dir. train() builds them unless out_dir already holds models
+    of the same books and settings, which are loaded instead.
+    """
+
+    def __init__(
+        self,
+        books: List[Moby],
+        out_dir: str,
+        num_topics: int = 3,
+        passes: int = 1,
+        workers: Optional[int] = None,
+    ):
+        self.books = books
+        self.out_dir = out_dir
+        self.num_topics = num_topics
+        self.passes = passes
+        # LdaMulticore uses every cpu but one for None
+        self.workers = workers
+        self.sentences = Sentences(books)
+        self.phrases: Any = None
+        self.dictionary: Any = None
+        self.tfidf: Any = None
+        self.lda: Any = None
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.out_dir, name)
+
+    def key(self) -> str:
+        """What the models were trained on, workers only change the speed."""
+        books = [f"{book.title}:{book.key()}" for book in self.books]
+        return digest(VERSION, str(self.num_topics), str(self.passes), *books)
+
+    def bows(self) -> Iterator[List[Tuple[int, int]]]:
+        """Bag of words of every sentence, after joining phrases."""
+        for tokens in self.sentences:
+            yield self.dictionary.doc2bow(self.phrases[tokens])
+
+    def train(self) -> "TopicModel":
+        os.makedirs(self.out_dir, exist_ok=True)
+        key = self.key()
+        try:
+            with open(self.path("topics.json")) as fh:
+                trained = json.load(fh)["key"] == key
+        except FileNotFoundError:
+            trained = False
+        if trained:
+            log.info(f"loading topic models from {self.out_dir}")
+            self.phrases = gensim.models.Phrases.load(self.path("phrases.model"))
+            self.dictionary = gensim.corpora.Dictionary.load(self.path("dictionary"))
+            self.tfidf = gensim.models.TfidfModel.load(self.path("tfidf.model"))
+            self.lda = gensim.models.LdaMulticore.load(self.path("lda.model"))
+            return self
+        # every pass below reads the books again, so without a cache each pass
+        # would parse them again, a book's token table is parsed once and kept
+        with span("token tables"):
+            for book in self.books:
+                book.token_table
+        with span("phrases"):
+            self.phrases = gensim.models.Phrases(self.sentences)
+        with span("dictionary"):
+            self.dictionary = gensim.corpora.Dictionary(
+                self.phrases[tokens] for tokens in self.sentences
+            )
+            self.dictionary.compactify()
+        with span("serialize corpus"):
+            gensim.corpora.MmCorpus.serialize(self.path("bow.mm"), self.bows())
+            corpus = gensim.corpora.MmCorpus(self.path("bow.mm"))
+        with span("tfidf"):
+            self.tfidf = gensim.models.TfidfModel(
+                corpus, id2word=self.dictionary, normalize=True
+            )
+            gensim.corpora.MmCorpus.serialize(self.path("tfidf.mm"), self.tfidf[corpus])
+        with span("lda"):
+            self.lda = gensim.models.LdaMulticore(
+                gensim.corpora.MmCorpus(self.path("tfidf.mm")),
+                num_topics=self.num_topics,
+                id2word=self.dictionary,
+                passes=self.passes,
+                workers=self.workers,
+            )
+        self.phrases.save(self.path("phrases.model"))
+        self.dictionary.save(self.path("dictionary"))
+        self.tfidf.save(self.path("tfidf.model"))
+        self.lda.save(self.path("lda.model"))
+        # written last, so models left by a run that failed midway are not reused
+        with open(self.path("topics.json"), "w") as fh:
+            json.dump({"key": key, "num_topics": self.num_topics}, fh)
+        return self
+
+    def chapter_topics(self) -> Iterator[Tuple[str, str, numpy.ndarray]]:
+        """
+        (title, chapter, topic distribution) of every chapter, the chapter
+        taken as the bag of words of all of its sentences.
+        """
+        current: Optional[Tuple[str, str]] = None
+        bow: Counter = Counter()
+        for title, chapter, tokens in self.sentences.labeled():
+            if (title, chapter) != current:
+                if current is not None:
+                    yield current[0], current[1], self._distribution(bow)
+                current, bow = (title, chapter), Counter()
+            bow.update(dict(self.dictionary.doc2bow(self.phrases[tokens])))
+        if current is not None:
+            yield current[0], current[1], self._distribution(bow)
+
+    def _distribution(self, bow: Counter) -> numpy.ndarray:
+        topics = numpy.zeros(self.num_topics)
+        doc = self.tfidf[sorted(bow.items())]
+        for topic, p in self.lda.get_document_topics(doc, minimum_probability=0):
+            topics[topic] = p
+        return topics
+
+    def write_chapter_topics(self, path: str) -> None:
+        """Writes the chapter topic distributions as tsv, a row per chapter."""
+        with open(path, "w") as fh:
+            writer = csv.writer(fh, delimiter="\t")
+            writer.writerow(
+                ["title", "chapter"] + [f"topic_{i}" for i in range(self.num_topics)]
+            )
+            for title, chapter, topics in self.chapter_topics():
+                writer.writerow([title, chapter] + [f"{p:0.6f}" for p in topics])
+
+    def topic_words(self, n: int = 10) -> Dict[int, List[Tuple[str, float]]]:
+        """The n most probable words of each topic."""
+        return {
+            topic: self.lda.show_topic(topic, topn=n)
+            for topic in range(self.num_topics)
+        }
@@ -0,0 +1,118 @@
+"""
+Persisted embedding matrices that load without spaCy.
+
+Each entry is a matrix saved as .npy, memory mapped when loaded so many worker
+processes share the pages, next to a json index of the key of every row plus
+whatever small metadata the writer adds. Matrices are float32 or, at half the
+size, float16, and are handed out as float32 rows either way.
+"""
+import json
+import os
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy  # type: ignore
+
+
+class Vectors:
+    """Rows of a matrix by key, meta is a json serializable dict."""
+
+    def __init__(
+        self,
+        keys: List[str],
+        matrix: numpy.ndarray,
+        meta: Optional[Dict[str, Any]] = None,
+    ):
+        if len(keys) != len(matrix):
+            raise ValueError(f"{len(keys)} keys for {len(matrix)} rows")
+        self.keys = keys
+        self.matrix = matrix
+        self.meta = meta or {}
+        self.index = {key: i for i, key in enumerate(keys)}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.index
+
+    def __getitem__(self, key: str) -> numpy.ndarray:
+        return numpy.asarray(self.matrix[self.index[key]], dtype="float32")
+
+    def rows(self, keys: Optional[Iterable[str]] = None) -> numpy.ndarray:
+        """The rows of keys, or of every key, in that order as float32."""
+        if keys is None:
+            return numpy.asarray(self.matrix, dtype="float32")
+        return numpy.asarray(
+            self.matrix[[self.index[key] for key in keys]], dtype="float32"
+        )
+
+
+class VectorStore:
+    """
+    Directory of named Vectors. An entry remembers the source it was made from,
+    typically a digest of the book and settings, and get() with a different
+    source misses, so stale vectors are never read.
+    """
+
+    def __init__(self, root: str, dtype: str = "float32"):
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"vectors are float32 or float16, not {dtype}")
+        self.root = root
+        self.dtype = dtype
+
+    def path(self, name: str, ext: str) -> str:
+        return os.path.join(self.root, f"{name}.{ext}")
+
+    def put(self, name: str, vectors: Vectors, source: Optional[str] = None) -> None:
+        """
+        Saves the vectors under name. The index is replaced last, so readers
+        see either the old entry or the complete new one.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        matrix = numpy.asarray(vectors.matrix, dtype=self.dtype)
+        self._replace(self.path(name, "npy"), lambda fh: numpy.save(fh, matrix))
+        index = {
+            "keys": vectors.keys,
+            "dtype": self.dtype,
+            "shape": list(matrix.shape),
+            "source": source,
+            "meta": vectors.meta,
+        }
+        data = json.dumps(index).encode("utf-8")
+        self._replace(self.path(name, "json"), lambda fh: fh.write(data))
+
+    def get(
+        self, name: str, source: Optional[str] = None, mmap: bool = True
+    ) -> Optional[Vectors]:
+        """
+        The vectors saved under name, None when there are none or when source
+        is given and differs from the one they were saved with.
+        """
+        try:
+            with open(self.path(name, "json")) as fh:
+                index = json.load(fh)
+        except FileNotFoundError:
+            return None
+        if source is not None and index["source"] != source:
+            return None
+        matrix = numpy.load(self.path(name, "npy"), mmap_mode="r" if mmap else None)
+        if list(matrix.shape) != index["shape"]:
+            # the matrix was replaced after the index was read
+            return None
+        return Vectors(index["keys"], matrix, index["meta"])
+
+    def names(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(f[:-5] for f in os.listdir(self.root) if f.endswith(".json"))
+
+    def _replace(self, path: str, write: Any) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                write(fh)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
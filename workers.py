@@ -0,0 +1,33 @@
+"""
+Process pools for jobs that do not depend on each other.
+
+Kept free of heavy imports, so commands that never parse, such as ingest and
+chart rendering, can spread their jobs over worker processes without paying
+for loading spaCy.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+def pool_size(processes: Optional[int] = None) -> int:
+    """Worker processes to use, None or less than 1 uses every cpu."""
+    if processes is None or processes < 1:
+        return os.cpu_count() or 1
+    return processes
+
+
+def run_pool(
+    fn: Callable[[Any], T], jobs: List[Any], processes: Optional[int] = None
+) -> List[T]:
+    """
+    fn of every job in order, run by up to pool_size(processes) worker
+    processes, or in this process when there is a single worker.
+    """
+    workers = max(min(pool_size(processes), len(jobs)), 1)
+    if workers == 1:
+        return [fn(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fn, jobs))